@@ -1,129 +1,44 @@
-import openai
-import pandas as pd
-import re
-from datetime import datetime
-import time
-import os
+import sys
 
-# OpenAI API Key 
-openai.api_key = ""
+# Add parent directory to the Python path for shared modules
+sys.path.append('..')
 
-# Static database environment information
-SYSTEM = 'PostgreSQL'
-VERSION = '14.17'
-HOSTING_ENVIRONMENT = 'Intel(R) Core(TM) i5-6200U @ 2.3GHz, 8GB RAM, 200GB SSD, Ubuntu 22.04'
-DATA_DISTRIBUTION = 'Uniform distribution, no significant skew'
+from catalog import Catalog
+from llm_client import OPENAI_API_URL
+from plan_parser import PLAN_STORE_SUFFIX, PlanStore
+from rewriters import LLMRewriter, llm_arg_parser, run_rewriter
 
-LOG_FILE = 'gpt_interactions.log'
-
-
-def log_interaction(log_file, query_id, prompt, response_text):
-    """Log prompt and response interactions to a file."""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    with open(log_file, 'a', encoding='utf-8') as f:
-        f.write(f"\n=== {timestamp} | Query ID: {query_id} ===\n")
-        f.write(">>> Prompt Sent:\n")
-        f.write(prompt + "\n")
-        f.write(">>> ChatGPT Response:\n")
-        f.write(response_text + "\n")
-        f.write("=" * 50 + "\n")
-
-
-def optimize_sql_query(original_query, db_info):
-    """Send a query optimization request to OpenAI and return the optimized query."""
-    prompt = f"""
-Please rewrite the following SQL query to improve execution time.
-Provide only the optimized SQL query as output, without explanations, comments, or schema modifications.
-
-Initial Query:
-{original_query}
-
-Database Management System:
-{db_info['dbms']} (Version: {db_info['version']})
-
-Hosting Environment:
-{db_info['hosting_environment']}
-
-Tables Info:
-{db_info['table_info']}
-
-Constraints Info:
-{db_info['constraint_info']}
-
-Indexes Info:
-{db_info['index_info']}
+# OpenAI API configuration
+OPENAI_API_KEY = ""
+MODEL = 'gpt-4o'
 
-Tables Size:
-{db_info['table_size']}
+# Concurrency and rate limits for the API
+CONCURRENCY = 8  # Requests in flight
+RATE_LIMIT = 5.0  # Requests per second
 
-Data Distribution:
-{db_info['data_distribution']}
+# On-disk cache of responses keyed by (model, temperature, max_tokens, prompt)
+CACHE_DIR = 'llm_cache'
 
-Initial Execution Plan:
-{db_info['execution_plan']}
-"""
-
-    start_time = time.perf_counter()
-    response = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=500,
-        temperature=0.1
-    )
-    end_time = time.perf_counter()
-
-    duration_ms = round((end_time - start_time) * 1000, 2)
+LOG_FILE = 'gpt_interactions.log'
 
-    response_text = response.choices[0].message.content.strip()
-    optimized_query = re.sub(r'```sql\n?|```', '', response_text).strip()
 
-    return optimized_query, prompt, response_text, duration_ms
+class ChatGPTRewriter(LLMRewriter):
+    name = 'ChatGPT'
+    model = MODEL
+    api_url = OPENAI_API_URL
+    log_file = LOG_FILE
 
 
 if __name__ == '__main__':
-    input_csv = 'Initial_queries_raw_results_redo.csv'
-    output_csv = 'optimized_queries.csv'
-
-    df = pd.read_csv(input_csv)
-    optimized_results = []
-
-    for index, row in df.iterrows():
-        print(f"Processing row {index + 1}/{len(df)}: Id={row['Id']}, TaskNo={row['TaskNo']}, ResponseId={row['ResponseId']}")
-
-        original_query = row['Query']
-        db_info = {
-            'dbms': SYSTEM,
-            'version': VERSION,
-            'hosting_environment': HOSTING_ENVIRONMENT,
-            'table_info': row.get('table_info', 'N/A'),
-            'constraint_info': row.get('constraint_info', 'N/A'),
-            'index_info': row.get('index_info', 'N/A'),
-            'table_size': row.get('table_size', 'N/A'),
-            'data_distribution': DATA_DISTRIBUTION,
-            'execution_plan': row.get('explain_run_5', 'N/A')
-        }
-
-        try:
-            optimized_query, prompt, response_text, duration_ms = optimize_sql_query(original_query, db_info)
-        except Exception as e:
-            optimized_query = "error"
-            prompt = f"(prompt could not be created)\nOriginal Query:\n{original_query}"
-            response_text = str(e)
-            duration_ms = -1
-
-        log_interaction(LOG_FILE, row['Id'], prompt, response_text)
-
-        optimized_results.append({
-            'Id': row['Id'],
-            'TaskNo': row['TaskNo'],
-            'ResponseId': row['ResponseId'],
-            'Difficulty': row.get('Difficulty', 'N/A'),
-            'Query': optimized_query,
-            'RewriteTime_ms': duration_ms
-        })
-
-    optimized_df = pd.DataFrame(optimized_results)
-    optimized_df.to_csv(output_csv, index=False)
-
-    print(f"Optimized queries saved to: {output_csv}")
+    parser = llm_arg_parser("Rewrite SQL queries with ChatGPT to improve execution time.",
+                            'Initial_queries_raw_results_redo.csv', OPENAI_API_URL,
+                            concurrency=CONCURRENCY, rate=RATE_LIMIT, cache_dir=CACHE_DIR)
+    args = parser.parse_args()
+
+    rewriter = ChatGPTRewriter(OPENAI_API_KEY, plans=PlanStore(args.input + PLAN_STORE_SUFFIX),
+                               api_url=args.api_url, concurrency=args.concurrency, rate=args.rate,
+                               cache_dir=None if args.no_cache else args.cache_dir,
+                               catalog=None if args.no_catalog else Catalog(cache_file=args.catalog),
+                               token_budget=args.token_budget)
+    run_rewriter(rewriter, args.input, args.output, args.checkpoint)
     print(f"Prompt/response log saved to: {LOG_FILE}")
@@ -0,0 +1,205 @@
+"""
+Persistent R-Bot docstore and memoized retrieval.
+
+- load_docstore(): the object built by my_rewriter's init_docstore() is saved once to
+  CACHE_DIR and loaded on later runs instead of being rebuilt. With joblib installed it is
+  stored with joblib and loaded with mmap_mode='r', so the numpy arrays of the index
+  (embeddings) are memory-mapped and shared by all worker processes through the page
+  cache; without joblib it is pickled. The cache is keyed by the source file of
+  init_docstore(), so a changed R-Bot build is not served a stale index.
+- MemoDocstore: wraps the docstore and memoizes the retrieval methods in
+  RETRIEVAL_METHODS, keyed by the normalized fingerprint of the query text passed
+  to them (literals, case and whitespace removed), in memory and on disk. Queries of
+  a task that differ only in literals or formatting reuse one retrieval.
+
+my_rewriter is not part of this repository: the docstore is treated as an opaque object,
+and only calls of the retrieval methods (RETRIEVAL_METHODS unless others are given) with a
+string argument are memoized. Everything else is passed through unchanged, including
+indexing, len(), iteration and membership, and isinstance() sees the wrapped class.
+If a rewrite calls none of the retrieval methods, a warning names the methods the
+docstore has, so the right ones can be configured.
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+import re
+import time
+
+try:
+    import joblib
+except ImportError:
+    joblib = None
+
+from result_store import append_csv_rows, atomic_write
+
+CACHE_DIR = 'docstore_cache'
+
+# Docstore/retriever methods whose results depend only on the query text
+RETRIEVAL_METHODS = ('retrieve', 'query', 'search', 'similarity_search', 'get_relevant_documents')
+
+STATS_COLUMNS = ['Id', 'pid', 'docstore_source', 'docstore_s', 'retrieval_calls', 'retrieval_hits', 'retrieval_ms']
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+
+def normalize_query(query):
+    """Query text without comments, literals, case and formatting differences."""
+    query = COMMENT.sub(' ', str(query))
+    query = STRING_LITERAL.sub('?', query)
+    query = NUMBER_LITERAL.sub('?', query)
+    return ' '.join(query.lower().split()).rstrip(';').strip()
+
+
+def query_fingerprint(query):
+    return hashlib.sha256(normalize_query(query).encode('utf-8')).hexdigest()[:16]
+
+
+def docstore_key(init_docstore):
+    """Cache key of the docstore: name, size and modification time of the module defining init_docstore()."""
+    try:
+        path = inspect.getfile(init_docstore)
+        stat = os.stat(path)
+        source = f'{path}:{stat.st_size}:{stat.st_mtime_ns}'
+    except (TypeError, OSError):
+        source = getattr(init_docstore, '__module__', 'docstore')
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+
+
+def load_docstore(init_docstore, cache_dir=CACHE_DIR, rebuild=False):
+    """Docstore from the on-disk cache, built with init_docstore() and cached if missing; returns (docstore, source, seconds)."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"docstore_{docstore_key(init_docstore)}.{'joblib' if joblib else 'pkl'}")
+    start = time.perf_counter()
+    if os.path.exists(path) and not rebuild:
+        try:
+            if joblib is not None:
+                docstore = joblib.load(path, mmap_mode='r')
+            else:
+                with open(path, 'rb') as f:
+                    docstore = pickle.load(f)
+            return docstore, 'cache', time.perf_counter() - start
+        except Exception as e:
+            print(f"[Docstore] Cache {path} unreadable, rebuilding: {e}")
+
+    docstore = init_docstore()
+    elapsed = time.perf_counter() - start
+    try:
+        if joblib is not None:
+            atomic_write(path, lambda f: joblib.dump(docstore, f))
+        else:
+            atomic_write(path, lambda f: pickle.dump(docstore, f, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception as e:
+        # Docstores holding open handles or clients cannot be serialized; they are rebuilt every run
+        print(f"[Docstore] Not cacheable, rebuilt on every run: {e}")
+    return docstore, 'built', elapsed
+
+
+class MemoDocstore:
+    """Proxy of a docstore memoizing its retrieval methods by normalized query fingerprint.
+    With memoize=False the calls are only timed (the baseline for the retrieval statistics)."""
+
+    def __init__(self, docstore, cache_dir=None, memoize=True, methods=RETRIEVAL_METHODS):
+        self._docstore = docstore
+        self._cache_dir = cache_dir if memoize else None
+        self._memoize = memoize
+        self._methods = tuple(methods)
+        self._memo = {}
+        self._warned = False
+        self.calls = self.hits = 0
+        self.retrieval_ms = 0.0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # isinstance() checks in my_rewriter see the class of the wrapped docstore
+    @property
+    def __class__(self):
+        return type(self._docstore)
+
+    # Special methods are looked up on the type, not through __getattr__
+    def __getitem__(self, key):
+        return self._docstore[key]
+
+    def __len__(self):
+        return len(self._docstore)
+
+    def __iter__(self):
+        return iter(self._docstore)
+
+    def __contains__(self, item):
+        return item in self._docstore
+
+    def __reduce_ex__(self, protocol):
+        # A copied or pickled proxy is the plain docstore (the memo stays with this process)
+        return self._docstore.__reduce_ex__(protocol)
+
+    def __getattr__(self, name):
+        attr = getattr(self._docstore, name)
+        if name not in self._methods or not callable(attr):
+            return attr
+
+        def memoized(*args, **kwargs):
+            query = next((arg for arg in list(args) + list(kwargs.values()) if isinstance(arg, str)), None)
+            if query is None:
+                return attr(*args, **kwargs)
+            rest = repr([arg for arg in args if arg is not query] + sorted(
+                (key, value) for key, value in kwargs.items() if value is not query))
+            key = f"{name}_{query_fingerprint(query)}_{hashlib.sha256(rest.encode('utf-8')).hexdigest()[:8]}"
+
+            start = time.perf_counter()
+            self.calls += 1
+            found, result = self._lookup(key) if self._memoize else (False, None)
+            if found:
+                self.hits += 1
+            else:
+                result = attr(*args, **kwargs)
+                if self._memoize:
+                    self._store(key, result)
+            self.retrieval_ms += (time.perf_counter() - start) * 1000
+            return result
+
+        return memoized
+
+    def _lookup(self, key):
+        if key in self._memo:
+            return True, self._memo[key]
+        if self._cache_dir:
+            path = os.path.join(self._cache_dir, f'{key}.pkl')
+            if os.path.exists(path):
+                try:
+                    with open(path, 'rb') as f:
+                        self._memo[key] = pickle.load(f)
+                    return True, self._memo[key]
+                except Exception:
+                    pass
+        return False, None
+
+    def _store(self, key, result):
+        self._memo[key] = result
+        if self._cache_dir:
+            try:
+                atomic_write(os.path.join(self._cache_dir, f'{key}.pkl'),
+                              lambda f: pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception:
+                pass  # Results that cannot be pickled are memoized in memory only
+
+    def warn_if_unused(self):
+        """Warn once if no retrieval method was called, i.e. nothing could be memoized."""
+        if self.calls or self._warned:
+            return
+        self._warned = True
+        public = sorted(name for name in dir(self._docstore)
+                        if not name.startswith('_') and callable(getattr(self._docstore, name, None)))
+        print(f"[Docstore] WARNING: none of the retrieval methods {', '.join(self._methods)} was called, "
+              f"so retrieval is not memoized; methods of {type(self._docstore).__name__}: {', '.join(public)}")
+
+    def counters(self):
+        return {'retrieval_calls': self.calls, 'retrieval_hits': self.hits, 'retrieval_ms': round(self.retrieval_ms, 2)}
+
+
+def append_retrieval_stats(path, stats):
+    """Append the retrieval counters of one rewrite to a CSV (compare runs with and without the caches)."""
+    append_csv_rows(path, STATS_COLUMNS, [stats])
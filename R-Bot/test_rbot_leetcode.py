@@ -1,111 +1,236 @@
+import ast
+import logging
 import os
 import sys
-import csv
-import argparse
+import time
 
 # Add parent directory to the Python path for module imports
 sys.path.append('..')
 
 # Import project modules
 from my_rewriter.config import init_llms, init_db_config
-from my_rewriter.database import DBArgs, Database
+from my_rewriter.database import DBArgs
 from my_rewriter.test_utils import test
 from my_rewriter.rag_retrieve import init_docstore
+from docstore_cache import CACHE_DIR, RETRIEVAL_METHODS, MemoDocstore, append_retrieval_stats, load_docstore
+from result_store import ResultStore
+from rewriters import Rewriter, rewriter_arg_parser, run_rewriter
 
-# Argument Parsing 
-parser = argparse.ArgumentParser(description="Run R-Bot rewrite for SQL queries using retrieval-augmented generation.")
-parser.add_argument('--database', type=str, required=True, help='Target PostgreSQL database name')
-parser.add_argument('--logdir', type=str, default='logs', help='Directory to store logs/results')
-parser.add_argument('--index', type=str, default='hybrid', help='Index type used for retrieval')
-parser.add_argument('--topk', type=int, default=10, help='Top-k documents to retrieve')
-args = parser.parse_args()
-
-# Configuration and Constants 
-model_args = init_llms(args.logdir)
-pg_config = init_db_config(args.database)
-pg_args = DBArgs(pg_config)
-
-RETRIEVER_TOP_K = args.topk
+# Configuration and Constants
 CASE_BATCH = 5
 RULE_BATCH = 10
 REWRITE_ROUNDS = 1
-DATABASE = args.database
-
-# Infer dataset type from database name
-if 'leetcode_uniform' in DATABASE:
-    DATASET = 'leetcode_uniform'
-else:
-    raise ValueError(f"Unsupported dataset: {DATABASE}")
-
-LOG_DIR = os.path.join(args.logdir, DATASET)
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# Load schema
-schema_path = os.path.join('..', DATASET, 'create_tables.sql')
-with open(schema_path, 'r') as f:
-    schema = f.read()
-
-# Initialize document store for RAG
-docstore = init_docstore()
-
-# Main Execution
-if DATASET == 'leetcode_uniform':
-    queries_path = os.path.join('..', DATASET, f'{DATASET}.csv')
-    print(f"Reading input queries from: {queries_path}")
-
-    with open(queries_path, mode='r', encoding='utf-8') as fin:
-        reader = csv.DictReader(fin)
-
-        output_csv_path = os.path.join(args.logdir, DATABASE, 'optimized_queries_leetcode_rbot.csv')
-        os.makedirs(os.path.dirname(output_csv_path), exist_ok=True)
-
-        with open(output_csv_path, mode='w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = reader.fieldnames + ['Optimized Query', 'Input Cost', 'Output Cost', 'Used Rules', 'Rewrite Time']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-            for row in reader:
-                query = row['Query']  
-                name = row.get('Id', 'unknown')
-
-                print(f"Processing query ID: {name}")
-
-                # Perform rewrite with R-Bot
-                test(
-                    name, query, schema, pg_args, model_args, docstore, LOG_DIR,
-                    RETRIEVER_TOP_K=RETRIEVER_TOP_K, CASE_BATCH=CASE_BATCH,
-                    RULE_BATCH=RULE_BATCH, REWRITE_ROUNDS=REWRITE_ROUNDS, index=args.index
-                )
-
-                # Read the rewrite result from the log file
-                log_filename = os.path.join(LOG_DIR, f"{name}.log")
-                if not os.path.exists(log_filename):
-                    print(f"Log file not found: {log_filename}")
-                    continue
-
-                last_res_line = None
-                with open(log_filename, 'r') as f:
-                    for line in f:
-                        if 'root INFO Rewrite Execution Results' in line:
-                            last_res_line = line
-
-                if last_res_line:
-                    try:
-                        # Parse result from log line (assumes result is in a Python dict format)
-                        res = eval(last_res_line[last_res_line.find('{'):])
-                        row['Optimized Query'] = res.get('output_sql', 'error')
-                        row['Output Cost'] = res.get('output_cost', '')
-                        row['Used Rules'] = ', '.join(res.get('used_rules', []))
-                        row['Rewrite Time'] = res.get('time', '')
-
-                        if row['Optimized Query'] == 'None':
-                            row['Optimized Query'] = 'error'
-
-                        writer.writerow(row)
-
-                    except Exception as e:
-                        print(f"Error parsing result for ID {name}: {e}")
-                        continue
-                else:
-                    print(f"No rewrite result found for ID {name}. Skipping.")
-                    continue
\ No newline at end of file
+
+# Log record carrying R-Bot's result dict, e.g. "root INFO Rewrite Execution Results: {...}"
+RESULT_MARKER = 'Rewrite Execution Results'
+
+# Structured event stream of rewrite results (one JSON line per query) in the dataset log directory
+RESULTS_FILE = 'rewrite_results.jsonl'
+
+# Per-query retrieval counters and docstore load time, for comparing runs with and without the caches
+RETRIEVAL_STATS_FILE = 'retrieval_stats.csv'
+
+
+def dataset_name(database):
+    """Infer dataset type from database name."""
+    if 'leetcode_uniform' in database:
+        return 'leetcode_uniform'
+    raise ValueError(f"Unsupported dataset: {database}")
+
+
+def parse_result(message):
+    """Result dict of a result log message, parsed as a Python literal (never evaluated)."""
+    return ast.literal_eval(message[message.find('{'):].strip())
+
+
+def number(value):
+    """A numeric result field as a number (None if missing, the text if not a number)."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return float(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def structured_result(res):
+    """JSON-serializable subset of an R-Bot result dict."""
+    output_sql = res.get('output_sql')
+    return {
+        'output_sql': None if output_sql in (None, 'None') else str(output_sql),
+        'input_cost': number(res.get('input_cost')),
+        'output_cost': number(res.get('output_cost')),
+        'used_rules': [str(rule) for rule in res.get('used_rules') or []],
+        'time': number(res.get('time')),
+    }
+
+
+def new_log_lines(path, offset):
+    """Lines appended to a log file after byte offset (the whole file if it was truncated)."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(offset if f.tell() >= offset else 0)
+        return f.read().decode('utf-8', errors='replace').splitlines()
+
+
+class ResultCapture(logging.Handler):
+    """Root logger handler keeping the last result message logged while a query is rewritten."""
+
+    def __init__(self):
+        super().__init__(level=logging.INFO)
+        self.message = None
+
+    def emit(self, record):
+        message = record.getMessage()
+        if RESULT_MARKER in message:
+            self.message = message
+
+
+class RBotRewriter(Rewriter):
+    """R-Bot retrieval-augmented rewrite.
+
+    The result is taken from the return value of test() if it returns one, else from the
+    result record captured by a logging handler while the query runs; the per-query log is
+    only read as a fallback, and then just the part written during this rewrite.
+    Every result is appended to <logdir>/<dataset>/rewrite_results.jsonl by the parent process.
+    R-Bot's own input cost and rewrite time (res['time']) go to the Input Cost and Rewrite Time
+    columns, as in earlier runs; RewriteTime_ms is the driver's wall time, as for the other tools.
+
+    The docstore is loaded from the persistent cache of docstore_cache.py and its retrieval
+    calls are memoized by query fingerprint, unless docstore_cache is None.
+    """
+
+    name = 'R-Bot'
+    extra_columns = ['Input Cost', 'Output Cost', 'Used Rules', 'Rewrite Time']
+
+    def __init__(self, database, logdir, index='hybrid', topk=10, docstore_cache=CACHE_DIR, rebuild_docstore=False,
+                 retrieval_methods=RETRIEVAL_METHODS):
+        self.database = database
+        self.logdir = logdir
+        self.index = index
+        self.topk = topk
+        self.docstore_cache = docstore_cache
+        self.rebuild_docstore = rebuild_docstore
+        self.retrieval_methods = retrieval_methods
+        self.dataset = dataset_name(database)
+        self.log_dir = os.path.join(logdir, self.dataset)
+        self.results = None
+
+    def setup(self):
+        # Called once per worker process: LLM clients, DB config and docstore are not shared
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.model_args = init_llms(self.logdir)
+        self.pg_args = DBArgs(init_db_config(self.database))
+
+        # Load schema
+        schema_path = os.path.join('..', self.dataset, 'create_tables.sql')
+        with open(schema_path, 'r') as f:
+            self.schema = f.read()
+
+        # Initialize document store for RAG (from the persistent cache if enabled)
+        if self.docstore_cache:
+            docstore, self.docstore_source, self.docstore_s = load_docstore(
+                init_docstore, self.docstore_cache, self.rebuild_docstore)
+        else:
+            start = time.perf_counter()
+            docstore, self.docstore_source = init_docstore(), 'built'
+            self.docstore_s = time.perf_counter() - start
+        print(f"[Docstore] {self.docstore_source} in {self.docstore_s:.2f} s (pid {os.getpid()})")
+        memo_dir = os.path.join(self.docstore_cache, 'retrieval') if self.docstore_cache else None
+        self.docstore = MemoDocstore(docstore, memo_dir, memoize=bool(self.docstore_cache),
+                                     methods=self.retrieval_methods)
+
+        self.capture = ResultCapture()
+        logging.getLogger().addHandler(self.capture)
+
+    def read_result(self, name, returned, log_filename, log_offset):
+        """R-Bot's result dict of the query just rewritten, or None."""
+        if isinstance(returned, dict) and 'output_sql' in returned:
+            return returned
+        if self.capture.message is not None:
+            return parse_result(self.capture.message)
+        if os.path.exists(log_filename):
+            lines = [line for line in new_log_lines(log_filename, log_offset) if RESULT_MARKER in line]
+            if lines:
+                return parse_result(lines[-1])
+        return None
+
+    def rewrite(self, row):
+        name = row.get('Id', 'unknown')
+        print(f"Processing query ID: {name}")
+
+        # Results of earlier runs in the per-query log are ignored
+        log_filename = os.path.join(self.log_dir, f"{name}.log")
+        log_offset = os.path.getsize(log_filename) if os.path.exists(log_filename) else 0
+        self.capture.message = None
+        previous = self.docstore.counters()
+
+        # Perform rewrite with R-Bot
+        returned = test(
+            name, row['Query'], self.schema, self.pg_args, self.model_args, self.docstore, self.log_dir,
+            RETRIEVER_TOP_K=self.topk, CASE_BATCH=CASE_BATCH,
+            RULE_BATCH=RULE_BATCH, REWRITE_ROUNDS=REWRITE_ROUNDS, index=self.index
+        )
+
+        self.docstore.warn_if_unused()
+        counters = self.docstore.counters()
+        append_retrieval_stats(os.path.join(self.log_dir, RETRIEVAL_STATS_FILE), {
+            'Id': name, 'pid': os.getpid(), 'docstore_source': self.docstore_source,
+            'docstore_s': round(self.docstore_s, 3),
+            **{key: round(value - previous[key], 2) for key, value in counters.items()},
+        })
+
+        try:
+            res = self.read_result(name, returned, log_filename, log_offset)
+        except (ValueError, SyntaxError) as e:
+            return {'Query': 'error', 'Error': f"Unparseable rewrite result for ID {name}: {e}"}
+        if res is None:
+            return {'Query': 'error', 'Error': f"No rewrite result found for ID {name}"}
+
+        res = structured_result(res)
+        return {
+            'Query': res['output_sql'] or 'error',
+            'Input Cost': '' if res['input_cost'] is None else res['input_cost'],
+            'Output Cost': '' if res['output_cost'] is None else res['output_cost'],
+            'Used Rules': ', '.join(res['used_rules']),
+            'Rewrite Time': '' if res['time'] is None else res['time'],
+            'res': res,
+        }
+
+    def record(self, row, result):
+        if 'res' in result:
+            if self.results is None:
+                os.makedirs(self.log_dir, exist_ok=True)
+                self.results = ResultStore(os.path.join(self.log_dir, RESULTS_FILE), ('Id',))
+            self.results.append((row.get('Id', 'unknown'),), result['res'])
+
+
+if __name__ == '__main__':
+    parser = rewriter_arg_parser("Run R-Bot rewrite for SQL queries using retrieval-augmented generation.",
+                                 os.path.join('..', 'leetcode_uniform', 'leetcode_uniform.csv'))
+    parser.add_argument('--database', type=str, required=True, help='Target PostgreSQL database name')
+    parser.add_argument('--logdir', type=str, default='logs', help='Directory to store logs/results')
+    parser.add_argument('--index', type=str, default='hybrid', help='Index type used for retrieval')
+    parser.add_argument('--topk', type=int, default=10, help='Top-k documents to retrieve')
+    parser.add_argument('--docstore-cache', type=str, default=CACHE_DIR,
+                        help='Directory of the persistent docstore and memoized retrieval results')
+    parser.add_argument('--no-docstore-cache', action='store_true', help='Build the docstore and retrieve for every query')
+    parser.add_argument('--rebuild-docstore', action='store_true', help='Rebuild the cached docstore')
+    parser.add_argument('--retrieval-methods', type=str, default=','.join(RETRIEVAL_METHODS),
+                        help='Comma-separated docstore methods whose results are memoized by query')
+    # --workers N runs N R-Bot processes, each loading its own docstore once in setup()
+    parser.set_defaults(output=None, checkpoint=None)
+    args = parser.parse_args()
+
+    # Output and checkpoint default to the per-database log directory
+    out_dir = os.path.join(args.logdir, args.database)
+    os.makedirs(out_dir, exist_ok=True)
+    output_csv = args.output or os.path.join(out_dir, 'optimized_queries_leetcode_rbot.csv')
+    checkpoint_file = args.checkpoint or os.path.join(out_dir, 'checkpoint.jsonl')
+
+    rewriter = RBotRewriter(args.database, args.logdir, index=args.index, topk=args.topk,
+                            docstore_cache=None if args.no_docstore_cache else args.docstore_cache,
+                            rebuild_docstore=args.rebuild_docstore,
+                            retrieval_methods=[name.strip() for name in args.retrieval_methods.split(',') if name.strip()])
+    print(f"Reading input queries from: {args.input}")
+    run_rewriter(rewriter, args.input, output_csv, checkpoint_file, workers=args.workers)
@@ -0,0 +1,300 @@
+"""
+Statistical comparison of a tool's optimized queries with the initial queries.
+
+The repeated runs of every query are reshaped into (n_queries x n_runs) arrays and
+all tests are computed column-wise in one call instead of per row:
+- Shapiro-Wilk normality of each sample (scipy, axis=1)
+- sample variances (ddof=1)
+- Levene's test for equal variances (median-centred, Brown-Forsythe), vectorized here
+- one-sided Mann-Whitney U test, initial > optimized (scipy, axis=1; exact if either sample is small and there are no ties)
+
+Failed runs ('error' / 'timeout') become NaN and are omitted from a query's sample.
+Test results are cached per row, keyed by a fingerprint of the row's run timings and
+equivalence status, so a rerun only recomputes new or changed rows.
+Used by the per-tool *_vs_initial_analysis.py scripts; run this module to analyse all
+tools in one pass (the initial results are loaded once):
+
+    python analysis.py --root .
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import f, mannwhitneyu, shapiro
+
+from columnar import load_plans, read_results, table_columns
+from result_store import ResultStore
+
+ALPHA = 0.05
+
+SUFFIXES = ('_optimazed', '_initial')
+
+TOOLS = ('ChatGPT', 'DeepSeek', 'R-Bot', 'LearnedRewrite', 'SlabCity')
+INITIAL_FILE = os.path.join('Initial_results', 'Initial_queries_raw_results.csv')
+COMBINED_FILE = 'Cross_tool_comparison.csv'
+
+# Rows of all result files are identified by this integer index
+INDEX = ['TaskNo', 'ResponseId']
+
+# Per-row test results, stored next to each experiment data file
+CACHE_SUFFIX = '.cache.jsonl'
+
+# Part of the row fingerprints; bump when compare_runs() changes, so cached test results are recomputed
+ANALYSIS_VERSION = 2
+
+TEST_COLUMNS = ['normality_initial', 'normality_optimazed', 'variance_initial', 'variance_optimazed',
+                'variance_equality', 'performance_difference', 'p_value_mannwhitney']
+
+
+def run_columns(df, metric='time_pg', suffix=''):
+    """Names of the per-run columns <metric>_<i><suffix>, in run order."""
+    pattern = re.compile(rf'^{metric}_(\d+){re.escape(suffix)}$')
+    runs = sorted((int(m.group(1)), col) for col in df.columns if (m := pattern.match(col)))
+    return [col for _, col in runs]
+
+
+def run_matrix(df, metric='time_pg', suffix=''):
+    """(n_queries x n_runs) float array of per-run values; non-numeric values become NaN."""
+    columns = run_columns(df, metric, suffix)
+    return df[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+
+def levene_median(a, b):
+    """Levene's test (center='median') of two samples per row; returns (statistic, p-value) arrays."""
+    groups = [np.abs(x - np.nanmedian(x, axis=1, keepdims=True)) for x in (a, b)]
+    counts = [np.sum(~np.isnan(z), axis=1) for z in groups]
+    means = [np.nanmean(z, axis=1) for z in groups]
+    n = counts[0] + counts[1]
+    grand_mean = (counts[0] * means[0] + counts[1] * means[1]) / n
+    between = sum(c * (m - grand_mean) ** 2 for c, m in zip(counts, means))
+    within = sum(np.nansum((z - m[:, None]) ** 2, axis=1) for z, m in zip(groups, means))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistic = (n - 2) * between / within
+    return statistic, f.sf(statistic, 1, n - 2)
+
+
+def mannwhitney_greater(a, b):
+    """One-sided Mann-Whitney U p-values per row (a > b).
+
+    scipy's method='auto' is decided once for the whole array, so rows are split by the
+    rule it applies to a single pair: exact distribution when either sample has at most
+    8 values and there are no ties, normal approximation otherwise (adaptive sampling
+    can leave the two sides with different run counts).
+    """
+    p_values = np.full(a.shape[0], np.nan)
+    both = np.concatenate([a, b], axis=1)
+    ordered = np.sort(both, axis=1)
+    has_ties = np.any(ordered[:, 1:] == ordered[:, :-1], axis=1)
+    small = (np.sum(~np.isnan(a), axis=1) <= 8) | (np.sum(~np.isnan(b), axis=1) <= 8)
+    for method, rows in (('exact', small & ~has_ties), ('asymptotic', ~(small & ~has_ties))):
+        if rows.any():
+            _, p_values[rows] = mannwhitneyu(a[rows], b[rows], alternative='greater', axis=1,
+                                             method=method, nan_policy='omit')
+    return p_values
+
+
+def compare_runs(initial, optimized):
+    """Normality, variance, Levene and Mann-Whitney results for every row of two run matrices."""
+    with np.errstate(all='ignore'):
+        _, p_orig = shapiro(initial, axis=1, nan_policy='omit')
+        _, p_opt = shapiro(optimized, axis=1, nan_policy='omit')
+        variance_initial = np.nanvar(initial, axis=1, ddof=1)
+        variance_optimazed = np.nanvar(optimized, axis=1, ddof=1)
+        _, p_levene = levene_median(initial, optimized)
+        p_mwu = mannwhitney_greater(initial, optimized)
+
+    return pd.DataFrame({
+        'normality_initial': np.where(p_orig > ALPHA, 'normal', 'not normal'),
+        'normality_optimazed': np.where(p_opt > ALPHA, 'normal', 'not normal'),
+        'variance_initial': variance_initial,
+        'variance_optimazed': variance_optimazed,
+        'variance_equality': np.where(p_levene >= ALPHA, 'equal variances', 'unequal variances'),
+        'performance_difference': np.where(p_mwu < ALPHA, 'significant', 'not significant'),
+        'p_value_mannwhitney': p_mwu,
+    })
+
+
+def keyed(df):
+    """Index a result table by integer (TaskNo, ResponseId); rows without a valid key are dropped."""
+    keys = df[INDEX].apply(pd.to_numeric, errors='coerce')
+    valid = keys.notna().all(axis=1)
+    index = pd.MultiIndex.from_frame(keys[valid].astype('int64'))
+    return df[valid].set_index(index)
+
+
+def keyed_plans(path):
+    """Plan columns of a result table, indexed like keyed(read_results(path)); loaded only to be written out."""
+    plans = load_plans(path).reset_index(drop=True)
+    return keyed(pd.concat([read_results(path, columns=INDEX), plans], axis=1)).drop(columns=INDEX)
+
+
+def output_columns(tool_file, initial_file, columns):
+    """Order of the experiment data columns: the joined raw result columns as in their CSVs, then the rest."""
+    joined = pd.DataFrame(columns=table_columns(tool_file)).join(
+        pd.DataFrame(columns=table_columns(initial_file)), lsuffix=SUFFIXES[0], rsuffix=SUFFIXES[1]).columns
+    order = [col for col in joined if col in columns]
+    return order + [col for col in columns if col not in order]
+
+
+def row_fingerprints(initial, optimized, equivalence):
+    """Hash of each row's run timings (both sides), equivalence status and ANALYSIS_VERSION."""
+    version = f'v{ANALYSIS_VERSION}'.encode('utf-8')
+    return [
+        hashlib.sha256(a.tobytes() + b.tobytes() + str(eq).encode('utf-8') + version).hexdigest()[:16]
+        for a, b, eq in zip(initial, optimized, equivalence)
+    ]
+
+
+def cached_compare_runs(merged_df, equivalence, cache=None):
+    """compare_runs() for the rows whose fingerprint changed; the others are taken from the cache."""
+    initial = run_matrix(merged_df, suffix='_initial')
+    optimized = run_matrix(merged_df, suffix='_optimazed')
+    if cache is None:
+        return compare_runs(initial, optimized), len(merged_df)
+
+    keys = [tuple(int(k) for k in key) for key in merged_df.index]
+    fingerprints = row_fingerprints(initial, optimized, equivalence)
+    records = cache.records()
+    stale = np.array([records.get(key, {}).get('fingerprint') != fp for key, fp in zip(keys, fingerprints)], dtype=bool)
+
+    results = [records[key]['values'] if not is_stale else None for key, is_stale in zip(keys, stale)]
+    if stale.any():
+        computed = compare_runs(initial[stale], optimized[stale]).to_dict('records')
+        for i, values in zip(np.flatnonzero(stale), computed):
+            results[i] = values
+            cache.append(keys[i], values, fingerprint=fingerprints[i])
+    return pd.DataFrame(results, columns=TEST_COLUMNS), int(stale.sum())
+
+
+def analyze(initial_df, tool_df, equivalence_df, cache=None, initial_plans=None, tool_plans=None):
+    """Join a tool's results with the initial results and append test results, metric differences and equivalence.
+
+    The frames must be indexed with keyed(); the initial frame can be shared by several tools.
+    With a cache (ResultStore), statistical tests are only recomputed for new or changed rows.
+    The plan columns (keyed_plans()) are not needed by the tests; if given, they are joined in the same way.
+    """
+    # === Merge initial and tool results ===
+    merged_df = tool_df.join(initial_df, how='inner', lsuffix=SUFFIXES[0], rsuffix=SUFFIXES[1])
+
+    # === Equivalence info ===
+    equivalence = equivalence_df[['Final equivalence status']].rename(
+        columns={'Final equivalence status': 'equivalent_query'})
+
+    # === Statistical tests and metric differences, for all rows at once ===
+    status = equivalence['equivalent_query'].groupby(level=INDEX).first().reindex(merged_df.index)
+    results_df, recomputed = cached_compare_runs(merged_df, status, cache)
+    print(f"Statistical tests: {recomputed} rows computed, {len(merged_df) - recomputed} from cache")
+    for metric in ('avg_pg_time', 'median_pg_time', 'avg_cost', 'avg_rows'):
+        results_df[f'{metric}_diff_optimazed_initial'] = (
+            pd.to_numeric(merged_df[f'{metric}_optimazed'], errors='coerce').to_numpy()
+            - pd.to_numeric(merged_df[f'{metric}_initial'], errors='coerce').to_numpy())
+
+    # === Combine results and merge equivalence info ===
+    final_df = pd.concat([merged_df, results_df.set_index(merged_df.index)], axis=1)
+    if initial_plans is not None and tool_plans is not None:
+        # The same inner join as merged_df, so the plan rows line up with it
+        plans = tool_plans.join(initial_plans, how='inner', lsuffix=SUFFIXES[0], rsuffix=SUFFIXES[1])
+        final_df = pd.concat([final_df, plans.set_index(final_df.index)], axis=1)
+    return final_df.join(equivalence, how='left')
+
+
+def run_analysis(tool, initial_file='Initial_queries_raw_results.csv', directory='.', initial_df=None, use_cache=True,
+                 initial_plans=None):
+    """Write <tool>_vs_Initial_queries_experiment_data.csv from the raw results of a tool.
+
+    The tests read the tables without their plans; the plan columns are loaded separately
+    (keyed_plans()) only to be copied into the experiment data file.
+    """
+    if initial_df is None:
+        initial_df = keyed(read_results(initial_file))
+    if initial_plans is None:
+        initial_plans = keyed_plans(initial_file)
+    tool_file = os.path.join(directory, f'{tool}_raw_results.csv')
+    tool_df = keyed(read_results(tool_file))
+    equivalence_df = keyed(pd.read_csv(os.path.join(directory, f'{tool}_vs_Initial_queries_row_comparison.csv')))
+
+    output_file = os.path.join(directory, f'{tool}_vs_Initial_queries_experiment_data.csv')
+    cache = ResultStore(output_file + CACHE_SUFFIX, INDEX) if use_cache else None
+    final_df = analyze(initial_df, tool_df, equivalence_df, cache, initial_plans, keyed_plans(tool_file))
+
+    final_df = final_df[output_columns(tool_file, initial_file, final_df.columns)]
+    final_df.to_csv(output_file, index=False)
+    print(f"File saved: {output_file}")
+    return final_df
+
+
+def is_true(values):
+    return values.astype(str).str.strip().str.upper() == 'TRUE'
+
+
+def combine(initial_df, results):
+    """Cross-tool table: one row per initial query, the median time and verdicts of every tool side by side."""
+    initial_df = initial_df[~initial_df.index.duplicated()]
+    combined = pd.DataFrame(index=initial_df.index)
+    combined['Difficulty'] = initial_df.get('Difficulty')
+    combined['median_pg_time_initial'] = pd.to_numeric(initial_df['median_pg_time'], errors='coerce')
+
+    medians = {}
+    for tool, final_df in results.items():
+        final_df = final_df[~final_df.index.duplicated()]
+        median = pd.to_numeric(final_df['median_pg_time_optimazed'], errors='coerce')
+        combined[f'{tool}_median_pg_time'] = median
+        combined[f'{tool}_speedup'] = combined['median_pg_time_initial'] / combined[f'{tool}_median_pg_time']
+        combined[f'{tool}_performance_difference'] = final_df['performance_difference']
+        combined[f'{tool}_equivalent_query'] = final_df['equivalent_query']
+        # Only equivalent rewrites compete for the best time
+        medians[tool] = median.where(is_true(final_df['equivalent_query'])).reindex(combined.index)
+
+    if medians:
+        medians = pd.DataFrame(medians)
+        has_best = medians.notna().any(axis=1)
+        combined['best_tool'] = None
+        combined.loc[has_best, 'best_tool'] = medians[has_best].idxmin(axis=1)
+    return combined.reset_index()
+
+
+def run_all(root='.', tools=TOOLS, initial_file=INITIAL_FILE, combined_file=COMBINED_FILE, use_cache=True):
+    """Write every tool's experiment data and the cross-tool table, loading the initial results once."""
+    start = time.perf_counter()
+    initial_path = os.path.join(root, initial_file)
+    initial_df = keyed(read_results(initial_path))
+    initial_plans = keyed_plans(initial_path)
+    print(f"Loaded {len(initial_df)} initial queries from {initial_file}")
+
+    results = {}
+    for tool in tools:
+        directory = os.path.join(root, tool)
+        if not any(os.path.exists(os.path.join(directory, f'{tool}_raw_results{ext}')) for ext in ('.csv', '.parquet')):
+            print(f"[{tool}] No raw results found in {directory}, skipped")
+            continue
+        results[tool] = run_analysis(tool, initial_path, directory, initial_df, use_cache, initial_plans)
+
+    combined_df = combine(initial_df, results)
+    combined_df.to_csv(os.path.join(root, combined_file), index=False)
+    print(f"File saved: {os.path.join(root, combined_file)}")
+
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Analysed {len(results)} tools in {time.perf_counter() - start:.2f} s, peak memory {peak_mb:.0f} MB")
+    return combined_df
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the optimized queries of all tools with the initial queries.")
+    parser.add_argument('--root', type=str, default='.', help='Repository directory with one subdirectory per tool')
+    parser.add_argument('--tools', nargs='+', default=list(TOOLS), help='Tools to analyse')
+    parser.add_argument('--initial', type=str, default=INITIAL_FILE, help='Raw results of the initial queries (relative to --root)')
+    parser.add_argument('--combined', type=str, default=COMBINED_FILE, help='Cross-tool table (relative to --root)')
+    parser.add_argument('--no-cache', action='store_true', help='Recompute the statistical tests of every row')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    run_all(args.root, args.tools, args.initial, args.combined, use_cache=not args.no_cache)
@@ -0,0 +1,237 @@
+"""
+Catalog introspection of the task schemas, used as database context in rewrite prompts.
+
+For every schema_<TaskNo> one query reads the tables and columns, constraints, indexes,
+table sizes and pg_stats (null fraction, distinct values, most common values,
+histogram bounds, correlation) from pg_catalog as a single JSON document.
+Documents are cached in a JSONL store keyed by (database, schema) together with the
+catalog version of the schema: a digest of its relations, constraints, row estimates
+and last ANALYZE. A cached schema costs one small version query per run; rows of the
+same task share the rendered context, so there are no further round trips.
+Given the query, the context is trimmed to the tables it references.
+
+    python catalog.py 181 534 ...   # print the prompt context of tasks
+"""
+
+import csv
+import re
+import sys
+
+import psycopg2
+
+from db_config import DB_CONFIG, source_schema
+from result_store import ResultStore
+
+CACHE_FILE = 'catalog_cache.jsonl'
+
+# Entries of the most common values and histogram bounds shown per column
+MCV_ENTRIES = 3
+HISTOGRAM_POINTS = 5
+
+# Changes with DDL, TRUNCATE/VACUUM FULL (relfilenode), ANALYZE and server upgrades
+VERSION_QUERY = """
+SELECT md5(concat_ws('|',
+    current_setting('server_version_num'),
+    (SELECT string_agg(concat_ws(':', c.relname, c.relkind, c.relfilenode, c.relnatts, c.reltuples, c.relpages,
+                                 s.last_analyze, s.last_autoanalyze), ',' ORDER BY c.relname)
+     FROM pg_class c LEFT JOIN pg_stat_all_tables s ON s.relid = c.oid
+     WHERE c.relnamespace = n.oid),
+    (SELECT string_agg(con.conname, ',' ORDER BY con.conname) FROM pg_constraint con WHERE con.connamespace = n.oid)))
+FROM pg_namespace n
+WHERE n.nspname = %(schema)s
+"""
+
+CATALOG_QUERY = """
+SELECT json_build_object(
+    'tables', (
+        SELECT json_agg(json_build_object(
+            'name', c.relname,
+            'rows', c.reltuples::bigint,
+            'bytes', pg_total_relation_size(c.oid),
+            'columns', (SELECT json_agg(json_build_array(a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull)
+                                        ORDER BY a.attnum)
+                        FROM pg_attribute a
+                        WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped)
+        ) ORDER BY c.relname)
+        FROM pg_class c
+        WHERE c.relnamespace = n.oid AND c.relkind IN ('r', 'p')),
+    'constraints', (
+        SELECT json_agg(json_build_array(c.relname, con.conname, pg_get_constraintdef(con.oid))
+                        ORDER BY c.relname, con.contype, con.conname)
+        FROM pg_constraint con JOIN pg_class c ON c.oid = con.conrelid
+        WHERE con.connamespace = n.oid),
+    'indexes', (
+        SELECT json_agg(json_build_array(i.tablename, i.indexname, i.indexdef) ORDER BY i.tablename, i.indexname)
+        FROM pg_indexes i
+        WHERE i.schemaname = n.nspname),
+    'stats', (
+        SELECT json_agg(json_build_object(
+            'table', s.tablename, 'column', s.attname, 'null_frac', s.null_frac, 'n_distinct', s.n_distinct,
+            'mcv', s.most_common_vals::text, 'mcf', s.most_common_freqs,
+            'histogram', s.histogram_bounds::text, 'correlation', s.correlation
+        ) ORDER BY s.tablename, s.attname)
+        FROM pg_stats s
+        WHERE s.schemaname = n.nspname)
+)
+FROM pg_namespace n
+WHERE n.nspname = %(schema)s
+"""
+
+
+def array_values(text):
+    """Elements of a PostgreSQL array literal such as {a,"b c",NULL}."""
+    if not text or text == '{}':
+        return []
+    return next(csv.reader([text[1:-1]], quotechar='"', escapechar='\\'))
+
+
+def pretty_size(size):
+    for unit in ('bytes', 'kB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f} {unit}' if unit == 'bytes' else f'{size:.1f} {unit}'
+        size /= 1024
+
+
+def spread(values, n):
+    """Up to n values evenly spaced over a sorted list, always including both ends."""
+    if len(values) <= n:
+        return values
+    return [values[round(i * (len(values) - 1) / (n - 1))] for i in range(n)]
+
+
+def column_distribution(stat, rows):
+    parts = [f"nulls {stat['null_frac']:.0%}"]
+    n_distinct = stat['n_distinct']
+    if n_distinct is not None:
+        # Negative n_distinct is a fraction of the row count
+        distinct = -n_distinct * rows if n_distinct < 0 else n_distinct
+        parts.append(f"~{distinct:.0f} distinct" + (" (unique)" if n_distinct == -1 else ""))
+    mcv = array_values(stat['mcv'])[:MCV_ENTRIES]
+    if mcv:
+        parts.append("most common " + ", ".join(f"{value} ({freq:.0%})" for value, freq in zip(mcv, stat['mcf'])))
+    bounds = array_values(stat['histogram'])
+    if bounds:
+        parts.append("histogram " + " .. ".join(spread(bounds, HISTOGRAM_POINTS)))
+    if stat['correlation'] is not None:
+        parts.append(f"correlation {stat['correlation']:.2f}")
+    return ", ".join(parts)
+
+
+def referenced_tables(query, names):
+    """Tables of the schema whose names occur in the query (all of them if none is found)."""
+    found = tuple(name for name in names if re.search(rf'\b{re.escape(name)}\b', query, flags=re.IGNORECASE))
+    return found or tuple(names)
+
+
+def render(document, schema, tables=None):
+    """Compact prompt context (the db_info fields) of a catalog document, restricted to `tables` if given."""
+    if tables is not None:
+        document = {
+            'tables': [table for table in document.get('tables') or [] if table['name'] in tables],
+            'constraints': [item for item in document.get('constraints') or [] if item[0] in tables],
+            'indexes': [item for item in document.get('indexes') or [] if item[0] in tables],
+            'stats': [stat for stat in document.get('stats') or [] if stat['table'] in tables],
+        }
+    tables = document.get('tables') or []
+    rows = {table['name']: max(table['rows'], 0) for table in tables}
+    qualifier = f'{schema}.'
+
+    table_info = [
+        f"{table['name']}(" + ", ".join(f"{name} {type_}" + (" NOT NULL" if not_null else "")
+                                        for name, type_, not_null in table['columns'] or []) + ")"
+        for table in tables
+    ]
+    constraint_info = [f"{table}: {definition}" for table, _, definition in document.get('constraints') or []]
+    index_info = [definition.replace('CREATE ', '', 1).replace(qualifier, '')
+                  for _, _, definition in document.get('indexes') or []]
+    table_size = [f"{table['name']}: ~{rows[table['name']]} rows, {pretty_size(table['bytes'])}" for table in tables]
+    data_distribution = [f"{stat['table']}.{stat['column']}: {column_distribution(stat, rows.get(stat['table'], 0))}"
+                         for stat in document.get('stats') or []]
+
+    return {
+        'table_info': "\n".join(table_info) or 'N/A',
+        'constraint_info': "\n".join(constraint_info) or 'N/A',
+        'index_info': "\n".join(index_info) or 'N/A',
+        'table_size': "\n".join(table_size) or 'N/A',
+        'data_distribution': "\n".join(data_distribution) or 'N/A (not analyzed)',
+    }
+
+
+class Catalog:
+    """Per-task database context from pg_catalog; the connection is opened on first use."""
+
+    def __init__(self, db_config=DB_CONFIG, cache_file=CACHE_FILE):
+        self.db_config = dict(db_config)
+        self.cache = ResultStore(cache_file, ('database', 'schema')) if cache_file else None
+        self.records = None
+        self.documents = {}
+        self.contexts = {}
+        self.conn = None
+        self.queries = 0
+
+    def __getstate__(self):
+        # Worker processes open their own connection
+        return {**self.__dict__, 'conn': None}
+
+    def query(self, sql, schema):
+        if self.conn is None:
+            self.conn = psycopg2.connect(**self.db_config)
+            self.conn.set_session(readonly=True, autocommit=True)
+        with self.conn.cursor() as cursor:
+            cursor.execute(sql, {'schema': schema})
+            self.queries += 1
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def document(self, schema):
+        """Catalog document of a schema, introspected only if its catalog version changed."""
+        version = self.query(VERSION_QUERY, schema)
+        if version is None:
+            raise ValueError(f"Schema {schema} not found in database {self.db_config.get('dbname')}")
+        key = (self.db_config.get('dbname'), schema)
+        if self.cache is not None:
+            if self.records is None:
+                self.records = self.cache.records()
+            record = self.records.get(key)
+            if record and record.get('fingerprint') == version:
+                return record['values']
+
+        document = self.query(CATALOG_QUERY, schema)
+        if self.cache is not None:
+            self.cache.append(key, document, fingerprint=version)
+            self.records[key] = {'values': document, 'fingerprint': version}
+        return document
+
+    def context(self, task_no, query=None):
+        """db_info fields of a task (only the tables the query references if given); introspected once per schema."""
+        schema = source_schema(int(task_no))
+        if schema not in self.documents:
+            self.documents[schema] = self.document(schema)
+        document = self.documents[schema]
+        tables = None
+        if query is not None:
+            tables = referenced_tables(query, [table['name'] for table in document.get('tables') or []])
+        key = (schema, tables)
+        if key not in self.contexts:
+            self.contexts[key] = render(document, schema, tables)
+        return self.contexts[key]
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    catalog = Catalog()
+    try:
+        for task_no in sys.argv[1:]:
+            print(f"=== {source_schema(int(task_no))} ===")
+            for field, text in catalog.context(task_no).items():
+                print(f"{field}:\n{text}\n")
+    finally:
+        catalog.close()
+    print(f"{catalog.queries} catalog queries")
@@ -0,0 +1,76 @@
+"""
+Shared checkpoint manifest for resumable, idempotent runs.
+
+Every runner (query measurements, rewriters, equivalence checker) records one
+entry per row keyed by (TaskNo, ResponseId, tool), together with the outcome
+status and a hash of the query text the entry was produced from.
+On restart a row is skipped only if its entry finished successfully and its
+query hash still matches; errored and stale entries are run again.
+"""
+
+import hashlib
+
+from result_store import KEY_COLUMNS, ResultStore
+
+# Statuses that count as finished work and are not run again (timed-out and invalid queries are final, not retried)
+DONE_STATUSES = ("ok", "partial", "timeout", "syntax_error")
+
+
+def query_hash(*queries):
+    """Stable hash of the query text(s) an entry depends on."""
+    digest = hashlib.sha256()
+    for query in queries:
+        digest.update(str(query).strip().encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class Checkpoint(ResultStore):
+    """Append-only manifest of per-row results for one tool."""
+
+    def __init__(self, path, tool, key_columns=KEY_COLUMNS):
+        super().__init__(path, key_columns)
+        self.tool = tool
+        self.entries = {key: record for key, record in self.records().items() if key[-1] == tool}
+
+    def row_key(self, row):
+        return super().row_key(row) + (self.tool,)
+
+    def clear(self):
+        super().clear()
+        self.entries = {}
+
+    def entry(self, row):
+        """Return the stored record of a row, or None."""
+        return self.entries.get(self.row_key(row))
+
+    def status(self, row, *queries):
+        """Return 'done', 'stale', 'error' or 'new' for a row and the query text(s) it would run."""
+        record = self.entry(row)
+        if record is None:
+            return "new"
+        if record.get("query_hash") != query_hash(*queries):
+            return "stale"
+        return "done" if record.get("status") in DONE_STATUSES else "error"
+
+    def is_done(self, row, *queries):
+        return self.status(row, *queries) == "done"
+
+    def record(self, row, values, status, *queries):
+        """Durably store the result of one row."""
+        key = self.row_key(row)
+        digest = query_hash(*queries)
+        self.append(key, values, status=status, query_hash=digest)
+        self.entries[key] = {"key": list(key), "values": dict(values), "status": status, "query_hash": digest}
+
+    def values(self, row):
+        """Return the stored result values of a row ({} if none)."""
+        record = self.entry(row)
+        return dict(record["values"]) if record else {}
+
+    def summary(self, rows, query_of):
+        """Count rows per status, given a function returning the query text(s) of a row."""
+        counts = {"done": 0, "stale": 0, "error": 0, "new": 0}
+        for row in rows:
+            counts[self.status(row, *query_of(row))] += 1
+        return counts
@@ -0,0 +1,219 @@
+"""
+Columnar (Parquet) storage for result tables.
+
+A result CSV <name>.csv is stored as two Parquet files:
+- <name>.parquet        every column except the plans (timings, costs, rows, statuses, queries)
+- <name>.plans.parquet  the EXPLAIN text columns (explain_run_<i>[_suffix]), same row order
+
+read_results() loads only the requested columns and never touches the plans unless
+asked, so scripts that need avg_pg_time do not parse the EXPLAIN text embedded in
+the CSV. It accepts the CSV path and uses the Parquet files when they exist and are
+not older than the CSV, so existing scripts keep working on plain CSVs.
+run_query_experiments.py refreshes the Parquet files whenever it writes a result CSV.
+
+pyarrow is an optional dependency; without it every read falls back to the CSV.
+Loaded tables are typed (see result_schema.py): numeric metrics as floats, status as a categorical.
+
+Conversion:
+    python columnar.py to-parquet results.csv [...]
+    python columnar.py to-csv results.parquet [...]
+"""
+
+import json
+import os
+import re
+import sys
+
+import pandas as pd
+
+from result_schema import STATUS_COLUMN, typed
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+PARQUET_SUFFIX = ".parquet"
+PLANS_SUFFIX = ".plans.parquet"
+
+# Columns holding EXPLAIN text, loaded lazily
+PLAN_COLUMN = re.compile(r"^explain_run_\d+")
+
+# Schema metadata key with the column order of the original CSV
+COLUMNS_METADATA_KEY = b"csv_columns"
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for Parquet result files (pip install pyarrow)")
+
+
+def base_path(path):
+    for suffix in (PLANS_SUFFIX, PARQUET_SUFFIX, ".csv"):
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def parquet_paths(path):
+    """Return (data, plans) Parquet paths of a result table given its CSV or Parquet path."""
+    base = base_path(path)
+    return base + PARQUET_SUFFIX, base + PLANS_SUFFIX
+
+
+def plan_columns(columns):
+    return [col for col in columns if PLAN_COLUMN.match(col)]
+
+
+def _arrow_safe(df):
+    """Object columns mixing numbers and strings (e.g. 'error' in a timing column) are stored as text."""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda v: v if v is None or isinstance(v, str) or v != v else str(v))
+    return df
+
+
+def _write_table(df, path, metadata=None):
+    table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    pq.write_table(table, path, compression="zstd")
+
+
+def write_results(df, path):
+    """Write a result table as <name>.parquet plus <name>.plans.parquet."""
+    require_pyarrow()
+    data_path, plans_path = parquet_paths(path)
+    plans = plan_columns(df.columns)
+    _write_table(df.drop(columns=plans), data_path,
+                 {COLUMNS_METADATA_KEY: json.dumps(list(df.columns)).encode("utf-8")})
+    if plans:
+        _write_table(df[plans], plans_path)
+    elif os.path.exists(plans_path):
+        os.remove(plans_path)
+    return data_path
+
+
+def has_parquet(path):
+    """True if current Parquet files exist for the result table (not older than its CSV)."""
+    if pq is None:
+        return False
+    data_path, _ = parquet_paths(path)
+    if not os.path.exists(data_path):
+        return False
+    csv_path = base_path(path) + ".csv"
+    return not os.path.exists(csv_path) or os.path.getmtime(data_path) >= os.path.getmtime(csv_path)
+
+
+def table_columns(path):
+    """Column names of a result table, plans included, in the order of its CSV."""
+    if has_parquet(path):
+        data_path, plans_path = parquet_paths(path)
+        order = json.loads((pq.read_schema(data_path).metadata or {}).get(COLUMNS_METADATA_KEY, b"[]"))
+        if order:
+            return order
+        plans = pq.read_schema(plans_path).names if os.path.exists(plans_path) else []
+        return pq.read_schema(data_path).names + plans
+    return list(pd.read_csv(base_path(path) + ".csv", nrows=0).columns)
+
+
+def load_plans(path, columns=None):
+    """Load the plan columns of a result table (all of them, or the requested ones)."""
+    if has_parquet(path):
+        _, plans_path = parquet_paths(path)
+        if not os.path.exists(plans_path):
+            return pd.DataFrame(columns=columns or [])
+        return pd.read_parquet(plans_path, columns=columns)
+    csv_path = base_path(path) + ".csv"
+    wanted = columns if columns is not None else (lambda col: bool(PLAN_COLUMN.match(col)))
+    return pd.read_csv(csv_path, usecols=wanted)
+
+
+def _check_status_columns(path, columns):
+    if pq is not None and has_parquet(path):
+        available = pq.read_schema(parquet_paths(path)[0]).names
+    else:
+        available = pd.read_csv(base_path(path) + ".csv", nrows=0).columns
+    missing = [col for col in columns if STATUS_COLUMN.match(col) and col not in available]
+    if missing:
+        raise ValueError(f"{path} has no {', '.join(missing)} column; "
+                         f"migrate it with: python result_schema.py {base_path(path)}.csv")
+
+
+def read_results(path, columns=None, plans=False):
+    """Load a typed result table; only `columns` if given, and plan columns only with plans=True."""
+    if columns is not None:
+        _check_status_columns(path, columns)
+    return typed(_read_results(path, columns, plans))
+
+
+def _read_results(path, columns=None, plans=False):
+    if not has_parquet(path):
+        csv_path = base_path(path) + ".csv"
+        if columns is not None:
+            return pd.read_csv(csv_path, usecols=columns)
+        return pd.read_csv(csv_path, usecols=None if plans else (lambda col: not PLAN_COLUMN.match(col)))
+
+    data_path, _ = parquet_paths(path)
+    data_columns = None
+    plan_requested = []
+    if columns is not None:
+        plan_requested = plan_columns(columns)
+        data_columns = [col for col in columns if col not in plan_requested]
+    df = pd.read_parquet(data_path, columns=data_columns)
+
+    if plans or plan_requested:
+        df = pd.concat([df, load_plans(path, plan_requested or None)], axis=1)
+        metadata = pq.read_schema(data_path).metadata or {}
+        order = json.loads(metadata.get(COLUMNS_METADATA_KEY, b"[]"))
+        wanted = columns if columns is not None else order
+        df = df[[col for col in wanted if col in df.columns]]
+    return df
+
+
+def csv_to_parquet(csv_path):
+    # The values survive a CSV -> Parquet -> CSV cycle, not the exact text: round_trip parsing keeps
+    # floats identical and integer columns with empty cells are stored as nullable Int64 instead of
+    # float, but an integral value in a float column is written back as 87.0 and booleans as True/False
+    df = pd.read_csv(csv_path, float_precision="round_trip")
+    with_na = [col for col in df.columns if pd.api.types.is_float_dtype(df[col]) and df[col].isna().any()]
+    if with_na:
+        nullable = pd.read_csv(csv_path, usecols=with_na, dtype_backend="numpy_nullable")
+        for col in with_na:
+            if isinstance(nullable[col].dtype, pd.Int64Dtype):
+                df[col] = nullable[col]
+    return write_results(df, csv_path)
+
+
+def refresh_parquet(csv_path):
+    """Rewrite the Parquet files of a result CSV that has just been written; no-op without pyarrow."""
+    if pa is None:
+        return None
+    return csv_to_parquet(csv_path)
+
+
+def parquet_to_csv(path, csv_path=None):
+    csv_path = csv_path or base_path(path) + ".csv"
+    data_path, _ = parquet_paths(path)
+    df = pd.read_parquet(data_path)
+    _, plans_path = parquet_paths(path)
+    if os.path.exists(plans_path):
+        df = pd.concat([df, pd.read_parquet(plans_path)], axis=1)
+    order = json.loads((pq.read_schema(data_path).metadata or {}).get(COLUMNS_METADATA_KEY, b"[]"))
+    df = df[[col for col in order if col in df.columns] + [col for col in df.columns if col not in order]]
+    df.to_csv(csv_path, index=False)
+    return csv_path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("to-parquet", "to-csv"):
+        print(__doc__)
+        sys.exit(1)
+    require_pyarrow()
+    for path in sys.argv[2:]:
+        if sys.argv[1] == "to-parquet":
+            print(f"{path} -> {csv_to_parquet(path)}")
+        else:
+            print(f"{path} -> {parquet_to_csv(path)}")
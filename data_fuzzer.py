@@ -0,0 +1,392 @@
+"""
+Equivalence fuzzing on small generated database instances.
+
+For every task, N_INSTANCES small randomized copies of schema_<TaskNo> are built in
+separate schemas fuzz_<TaskNo>_<i> (same tables, column types and constraints via
+CREATE TABLE ... LIKE ... INCLUDING ALL). Column values are drawn from a handful of
+values sampled from the real tables. Columns that join (same name and type, or linked
+by a foreign key) share one domain sampled from all of them, so joins still match, and
+the literals the task's queries compare a column with (col = 5, col IN (...),
+col BETWEEN ... AND ...) are added to that column's domain, so filters select some rows.
+The tiny domains produce duplicates and ties; nullable columns get NULLs, and tables are
+sometimes left empty. Foreign keys are not copied.
+
+Each initial/optimized pair is then compared on every instance with the checker of
+queries_comparison.py (schema_<TaskNo>. qualifiers are rewritten to the instance
+schema), and the per-instance verdicts are recorded in a checkpoint manifest (fuzz_detail column).
+Instances on which both queries return no rows only give a vacuous TRUE; their number is
+recorded in the fuzz_empty column.
+"""
+
+import argparse
+import decimal
+import json
+import random
+import re
+
+import pandas as pd
+import psycopg2
+from psycopg2 import sql
+
+from checkpoint import Checkpoint
+from db_config import DB_CONFIG, source_schema
+from queries_comparison import QUERY_FILE, VERDICT_MODE, VERDICT_MODES, canonical, connect, strip_query, verify_pair
+
+# Number of generated instances per task
+N_INSTANCES = 5
+
+# Rows per table are drawn from 0..MAX_ROWS
+MAX_ROWS = 20
+
+# Distinct values per column; small domains force duplicates and ties
+DOMAIN_SIZE = 4
+DOMAIN_SAMPLE = 200  # Rows of the real table sampled to pick the domain
+
+NULL_PROB = 0.2  # Probability of NULL in a nullable column
+EMPTY_TABLE_PROB = 0.15  # Probability of leaving a table empty
+DUPLICATE_PROB = 0.3  # Probability of repeating an already generated row
+
+SEED = 42
+
+# Statement timeout per query on the small instances (ms)
+PAIR_TIMEOUT_MS = 10000
+
+STORE_SUFFIX = ".fuzz.jsonl"
+TOOL = "fuzz"
+
+FUZZ_COLUMNS = ["fuzz_instances", "fuzz_nonequivalent", "fuzz_empty", "fuzz_verdict", "fuzz_counterexample",
+                "fuzz_detail"]
+
+# Literals compared with a column in the queries: col <op> literal, literal <op> col, col IN (...), col BETWEEN ... AND ...
+_IDENT = r'(?:"[^"]+"|[A-Za-z_][A-Za-z0-9_$]*)'
+_COLUMN = rf'((?:{_IDENT}\s*\.\s*)*{_IDENT})'
+_LITERAL = r"(?:(?:date|timestamp|time)\s+)?('(?:[^']|'')*'|-?\d+(?:\.\d+)?)(?:\s*::\s*\w+)?"
+_OPERATOR = r"(?:=|<>|!=|<=|>=|<|>)"
+LITERAL_PATTERNS = (
+    re.compile(rf"{_COLUMN}\s*{_OPERATOR}\s*{_LITERAL}", re.IGNORECASE),
+    re.compile(rf"{_LITERAL}\s*{_OPERATOR}\s*{_COLUMN}", re.IGNORECASE),
+    re.compile(rf"{_COLUMN}\s+(?:not\s+)?in\s*\(((?:\s*{_LITERAL}\s*,)*\s*{_LITERAL})\s*\)", re.IGNORECASE),
+    re.compile(rf"{_COLUMN}\s+(?:not\s+)?between\s+{_LITERAL}\s+and\s+{_LITERAL}", re.IGNORECASE),
+)
+_LITERAL_VALUE = re.compile(_LITERAL, re.IGNORECASE)
+
+
+def instance_schema(task_no, instance):
+    return f"fuzz_{task_no}_{instance}"
+
+
+def rewrite_query(query, task_no, instance):
+    """Point schema_<TaskNo>. qualifiers of a query at a generated instance."""
+    return re.sub(rf'\b{source_schema(task_no)}\.', f"{instance_schema(task_no, instance)}.", query, flags=re.IGNORECASE)
+
+
+def literal_value(token):
+    """Python value of a SQL literal token: str for quoted literals, int or Decimal for numbers."""
+    if token.startswith("'"):
+        return token[1:-1].replace("''", "'")
+    return decimal.Decimal(token) if "." in token else int(token)
+
+
+def query_literals(queries):
+    """Return {column name (lower case): [literal values]} of the literals the queries compare columns with."""
+    literals = {}
+
+    def add(column, tokens):
+        name = re.split(r"\s*\.\s*", column)[-1].strip('"').lower()
+        values = literals.setdefault(name, {})
+        for token in tokens:
+            value = literal_value(token)
+            values.setdefault(json.dumps(canonical(value)), value)
+
+    for query in queries:
+        if not isinstance(query, str):
+            continue
+        for match in LITERAL_PATTERNS[0].finditer(query):
+            add(match.group(1), [match.group(2)])
+        for match in LITERAL_PATTERNS[1].finditer(query):
+            add(match.group(2), [match.group(1)])
+        for match in LITERAL_PATTERNS[2].finditer(query):
+            add(match.group(1), _LITERAL_VALUE.findall(match.group(2)))
+        for match in LITERAL_PATTERNS[3].finditer(query):
+            add(match.group(1), [match.group(2), match.group(3)])
+    return {name: list(values.values()) for name, values in literals.items()}
+
+
+def table_columns(conn, schema):
+    """Return {table: [(column, nullable)]} of the base tables of a schema."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """SELECT c.table_name, c.column_name, c.is_nullable = 'YES'
+               FROM information_schema.columns c
+               JOIN information_schema.tables t USING (table_schema, table_name)
+               WHERE c.table_schema = %s AND t.table_type = 'BASE TABLE'
+               ORDER BY c.table_name, c.ordinal_position""",
+            (schema,),
+        )
+        tables = {}
+        for table, column, nullable in cursor.fetchall():
+            tables.setdefault(table, []).append((column, nullable))
+    return tables
+
+
+def column_groups(conn, schema):
+    """Groups of (table, column) of a schema that share a value domain: same name and type, or linked by a foreign key."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """SELECT c.table_name, c.column_name, c.data_type
+               FROM information_schema.columns c
+               JOIN information_schema.tables t USING (table_schema, table_name)
+               WHERE c.table_schema = %s AND t.table_type = 'BASE TABLE'
+               ORDER BY c.table_name, c.ordinal_position""",
+            (schema,),
+        )
+        columns = cursor.fetchall()
+        cursor.execute(
+            """SELECT c.relname, a.attname, rc.relname, ra.attname
+               FROM pg_constraint con
+               CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(attnum, ref_attnum)
+               JOIN pg_class c ON c.oid = con.conrelid
+               JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+               JOIN pg_class rc ON rc.oid = con.confrelid
+               JOIN pg_attribute ra ON ra.attrelid = con.confrelid AND ra.attnum = k.ref_attnum
+               WHERE con.contype = 'f' AND con.connamespace = %s::regnamespace
+                 AND rc.relnamespace = con.connamespace""",
+            (schema,),
+        )
+        foreign_keys = cursor.fetchall()
+
+    # Union-find over (table, column)
+    parent = {(table, column): (table, column) for table, column, _ in columns}
+
+    def find(member):
+        while parent[member] != member:
+            parent[member] = parent[parent[member]]
+            member = parent[member]
+        return member
+
+    def union(a, b):
+        if a in parent and b in parent:
+            parent[find(a)] = find(b)
+
+    first = {}
+    for table, column, data_type in columns:
+        union((table, column), first.setdefault((column.lower(), data_type), (table, column)))
+    for table, column, ref_table, ref_column in foreign_keys:
+        union((table, column), (ref_table, ref_column))
+
+    groups = {}
+    for member in parent:
+        groups.setdefault(find(member), []).append(member)
+    return list(groups.values())
+
+
+def group_domain(conn, schema, members, rng):
+    """Pick up to DOMAIN_SIZE distinct non-NULL values from a random sample of all columns of a group."""
+    union = sql.SQL(" UNION ALL ").join(
+        sql.SQL("SELECT {c} FROM {s}.{t} WHERE {c} IS NOT NULL").format(
+            c=sql.Identifier(column), s=sql.Identifier(schema), t=sql.Identifier(table))
+        for table, column in members)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT setseed(%s)", (rng.random() * 2 - 1,))
+        cursor.execute(sql.SQL("SELECT * FROM ({}) AS v ORDER BY random() LIMIT %s").format(union), (DOMAIN_SAMPLE,))
+        domain = {}
+        for (value,) in cursor.fetchall():
+            domain.setdefault(json.dumps(canonical(value)), value)
+            if len(domain) >= DOMAIN_SIZE:
+                break
+    return list(domain.values())
+
+
+def generate_rows(columns, domains, rng):
+    """Random rows over the column domains, with NULLs, repeated rows and possibly no rows at all."""
+    if rng.random() < EMPTY_TABLE_PROB:
+        return []
+    rows = []
+    for _ in range(rng.randint(1, MAX_ROWS)):
+        if rows and rng.random() < DUPLICATE_PROB:
+            rows.append(rng.choice(rows))
+            continue
+        row = []
+        for column, nullable in columns:
+            domain = domains[column]
+            if not domain or (nullable and rng.random() < NULL_PROB):
+                row.append(None)
+            else:
+                row.append(rng.choice(domain))
+        rows.append(tuple(row))
+    return rows
+
+
+def build_instances(conn, task_no, n_instances=N_INSTANCES, seed=SEED, rebuild=False, literals=None):
+    """Create the fuzz_<TaskNo>_<i> schemas of a task (existing ones are kept unless rebuild is set);
+    literals ({column name: [values]}, see query_literals()) are added to the domains of those columns."""
+    literals = literals or {}
+    source = source_schema(task_no)
+    tables = table_columns(conn, source)
+    if not tables:
+        raise ValueError(f"No tables found in {source}")
+    groups = column_groups(conn, source)
+
+    with conn.cursor() as cursor:
+        for instance in range(n_instances):
+            target = instance_schema(task_no, instance)
+            cursor.execute("SELECT 1 FROM information_schema.schemata WHERE schema_name = %s", (target,))
+            if cursor.fetchone() and not rebuild:
+                continue
+
+            rng = random.Random(f"{seed}:{task_no}:{instance}")
+            cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(target)))
+            cursor.execute(sql.SQL("CREATE SCHEMA {}").format(sql.Identifier(target)))
+            # One domain per group of joinable columns, drawn from by every table of the group,
+            # together with the literals any column of the group is compared with
+            domains = {}
+            for members in groups:
+                domain = {json.dumps(canonical(value)): value for value in group_domain(conn, source, members, rng)}
+                for _, column in members:
+                    for value in literals.get(column.lower(), []):
+                        domain.setdefault(json.dumps(canonical(value)), value)
+                domains.update((member, list(domain.values())) for member in members)
+            inserted = 0
+            for table, columns in tables.items():
+                cursor.execute(sql.SQL("CREATE TABLE {}.{} (LIKE {}.{} INCLUDING ALL)").format(
+                    sql.Identifier(target), sql.Identifier(table), sql.Identifier(source), sql.Identifier(table)))
+                insert = sql.SQL("INSERT INTO {}.{} ({}) VALUES ({}) ON CONFLICT DO NOTHING").format(
+                    sql.Identifier(target), sql.Identifier(table),
+                    sql.SQL(", ").join(sql.Identifier(column) for column, _ in columns),
+                    sql.SQL(", ").join(sql.Placeholder() * len(columns)))
+                table_domains = {column: domains.get((table, column), []) for column, _ in columns}
+                for row in generate_rows(columns, table_domains, rng):
+                    # Rows violating NOT NULL or CHECK constraints, or holding a literal the column
+                    # type does not accept, are skipped
+                    cursor.execute("SAVEPOINT fuzz_row")
+                    try:
+                        cursor.execute(insert, row)
+                        inserted += cursor.rowcount
+                    except (psycopg2.IntegrityError, psycopg2.DataError):
+                        cursor.execute("ROLLBACK TO SAVEPOINT fuzz_row")
+                    else:
+                        cursor.execute("RELEASE SAVEPOINT fuzz_row")
+            conn.commit()
+            print(f"[Task {task_no}] Built {target}: {len(tables)} tables, {inserted} rows")
+
+
+def drop_instances(conn, task_no, n_instances=N_INSTANCES):
+    with conn.cursor() as cursor:
+        for instance in range(n_instances):
+            cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(
+                sql.Identifier(instance_schema(task_no, instance))))
+    conn.commit()
+
+
+def both_empty(conn, init_query, opt_query, timeout_ms=PAIR_TIMEOUT_MS):
+    """True if neither query returns a row; None if that cannot be checked."""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+            # Concatenated rather than formatted, since the queries may contain braces or percent signs
+            cursor.execute("SELECT NOT EXISTS (" + strip_query(init_query) + ") AND NOT EXISTS ("
+                           + strip_query(opt_query) + ")")
+            return cursor.fetchone()[0]
+    except psycopg2.Error:
+        return None
+    finally:
+        conn.rollback()
+
+
+def fuzz_pair(conn, task_no, init_query, opt_query, label="", n_instances=N_INSTANCES, mode=VERDICT_MODE,
+              timeout_ms=PAIR_TIMEOUT_MS):
+    """Compare a pair on every instance of its task; returns (values, status) with per-instance verdicts."""
+    instances = []
+    for instance in range(n_instances):
+        values, status = verify_pair(
+            conn, rewrite_query(init_query, task_no, instance), rewrite_query(opt_query, task_no, instance),
+            f"{label} [{instance_schema(task_no, instance)}]", mode, timeout_ms)
+        empty = False
+        if values["except_equal"] == "TRUE":
+            empty = both_empty(conn, rewrite_query(init_query, task_no, instance),
+                               rewrite_query(opt_query, task_no, instance), timeout_ms)
+        instances.append({"instance": instance_schema(task_no, instance), "status": status, "empty": empty, **values})
+
+    # Per-instance verdicts, e.g. "fuzz_175_0:TRUE;fuzz_175_1:FALSE"
+    detail = ";".join(f"{i['instance']}:{i['except_equal']}" for i in instances)
+
+    nonequivalent = [i["instance"] for i in instances if i["except_equal"] in ("FALSE", "COLUMN_MISMATCH")]
+    failed = [i for i in instances if i["status"] != "ok"]
+    if nonequivalent:
+        verdict = "FALSE"
+    elif failed:
+        verdict = "ERROR" if any(i["status"] == "error" for i in failed) else "TIMEOUT"
+    else:
+        verdict = "TRUE"
+    values = {
+        "fuzz_instances": n_instances,
+        "fuzz_nonequivalent": len(nonequivalent),
+        "fuzz_empty": sum(1 for i in instances if i["empty"]),
+        "fuzz_verdict": verdict,
+        "fuzz_counterexample": nonequivalent[0] if nonequivalent else "",
+        "fuzz_detail": detail,
+    }
+    return values, {"ERROR": "error", "TIMEOUT": "timeout"}.get(verdict, "ok")
+
+
+def run_fuzzing(query_file=QUERY_FILE, n_instances=N_INSTANCES, seed=SEED, mode=VERDICT_MODE,
+                timeout_ms=PAIR_TIMEOUT_MS, rebuild=False, drop=False, store_file=None):
+    df = pd.read_csv(query_file)
+    store = Checkpoint(store_file or query_file + STORE_SUFFIX, TOOL)
+    if rebuild:
+        # New data invalidates the stored verdicts
+        store.clear()
+
+    build_conn = psycopg2.connect(**DB_CONFIG)
+    conn = connect()
+    checked = empty = 0
+    try:
+        for task_no, group in df.groupby("TaskNo", sort=True):
+            pending = [(idx, row) for idx, row in group.iterrows()
+                       if not store.is_done(row, row['Initial Query'], row['Optimized query'])]
+            if not pending:
+                continue
+            literals = query_literals(list(group['Initial Query']) + list(group['Optimized query']))
+            build_instances(build_conn, task_no, n_instances, seed, rebuild, literals)
+
+            for idx, row in pending:
+                init_query = row['Initial Query']
+                opt_query = row['Optimized query']
+                values, status = fuzz_pair(conn, task_no, init_query, opt_query, f"[Row {idx + 1}/{len(df)}]",
+                                           n_instances, mode, timeout_ms)
+                store.record(row, values, status, init_query, opt_query)
+                print(f"[Row {idx + 1}/{len(df)}] Fuzz verdict: {values['fuzz_verdict']} "
+                      f"({values['fuzz_nonequivalent']}/{n_instances} instances differ, "
+                      f"{values['fuzz_empty']} empty on both sides)")
+                checked += n_instances
+                empty += values['fuzz_empty']
+
+            if drop:
+                drop_instances(build_conn, task_no, n_instances)
+    finally:
+        conn.close()
+        build_conn.close()
+
+    if checked:
+        print(f"Both queries returned no rows on {empty} of {checked} pair instances ({empty / checked:.0%}), "
+              f"where the verdict is vacuous")
+    store.materialize(query_file, columns=FUZZ_COLUMNS)
+    print(f"Fuzzing completed. Verdicts saved to {query_file}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check query equivalence on small randomized database instances.")
+    parser.add_argument("--file", type=str, default=QUERY_FILE, help="Comparison CSV (verdicts are written back)")
+    parser.add_argument("--instances", type=int, default=N_INSTANCES, help="Generated instances per task")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the data generator")
+    parser.add_argument("--mode", type=str, default=VERDICT_MODE, choices=VERDICT_MODES, help="Verdict mode of the comparison")
+    parser.add_argument("--timeout", type=int, default=PAIR_TIMEOUT_MS, help="Statement timeout per query (ms)")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate instances and discard stored verdicts")
+    parser.add_argument("--drop", action="store_true", help="Drop the generated schemas of a task when it is done")
+    parser.add_argument("--store", type=str, default=None, help=f"Checkpoint manifest (default: <file>{STORE_SUFFIX})")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_fuzzing(args.file, args.instances, args.seed, args.mode, args.timeout, args.rebuild, args.drop, args.store)
@@ -0,0 +1,18 @@
+"""
+Connection parameters of the experiment database and naming of its per-task schemas,
+shared by the measurement, comparison, fuzzing and catalog scripts.
+"""
+
+# Database connection parameters
+DB_CONFIG = {
+    "dbname": "leetcode_uniform",
+    "user": "postgres",
+    "password": "",
+    "host": "localhost",
+    "port": "5432",
+}
+
+
+def source_schema(task_no):
+    """Schema holding the tables of a LeetCode task."""
+    return f"schema_{task_no}"
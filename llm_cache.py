@@ -0,0 +1,87 @@
+"""
+Content-addressed on-disk cache for LLM rewrite responses.
+
+Entries are keyed by a SHA-256 of (model, temperature, max_tokens, prompt) and hold the
+response text together with the latency of the original request, so a rerun reproduces
+both the rewrite and its RewriteTime_ms without calling the API.
+When the cache grows beyond `max_bytes`, least recently used entries are evicted.
+"""
+
+import hashlib
+import json
+import os
+
+from result_store import atomic_write
+
+
+def cache_key(model, temperature, max_tokens, prompt):
+    payload = json.dumps([model, temperature, max_tokens, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Directory of <key[:2]>/<key>.json entries with size-based LRU eviction and hit/miss counters."""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.size_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        """Yield (path, size, last access time) of every entry."""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    yield path, stat.st_size, stat.st_mtime
+
+    def get(self, key):
+        """Return the stored entry or None; a hit marks the entry as recently used."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """Store an entry atomically, then evict old entries if the cache is over its size limit."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        atomic_write(path, lambda f: f.write(data))
+        self.size_bytes += len(data) - old_size
+        if self.size_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        for path, size, _ in sorted(self._entries(), key=lambda entry: entry[2]):
+            if self.size_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            self.size_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'size_bytes': self.size_bytes,
+        }
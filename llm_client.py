@@ -0,0 +1,218 @@
+"""
+Asynchronous client for OpenAI-compatible chat completion APIs (OpenAI, DeepSeek).
+
+Prompts are sent concurrently with:
+- bounded concurrency (at most `concurrency` requests in flight)
+- token-bucket rate limiting (`rate` requests per second, bursts up to `burst`)
+- retries with exponential backoff on 429/5xx and transport errors (Retry-After is honoured)
+- results returned in prompt order, plus throughput and latency percentiles
+- an optional ResponseCache: identical requests are answered from disk with their original latency;
+  identical prompts within a batch are sent once and the reply is shared (counted as cache hits)
+
+Point `api_url` at a local mock server to exercise the client without an API key.
+"""
+
+import asyncio
+import random
+import re
+import statistics
+import time
+
+import httpx
+
+from llm_cache import cache_key
+
+OPENAI_API_URL = 'https://api.openai.com/v1/chat/completions'
+DEEPSEEK_API_URL = 'https://api.deepseek.com/v1/chat/completions'
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+
+def extract_query(response_text):
+    """Strip Markdown code fences from a model response."""
+    return re.sub(r'```sql\n?|```', '', response_text).strip()
+
+
+class TokenBucket:
+    """Token bucket: `rate` tokens per second, holding at most `burst` tokens."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncRewriteClient:
+    """Sends batches of prompts to a chat completion endpoint and collects the responses in order."""
+
+    def __init__(self, api_url, api_key, model, max_tokens=500, temperature=0.1, concurrency=8,
+                 rate=5.0, burst=None, max_retries=5, backoff_s=1.0, timeout_s=120.0, cache=None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+        self.cache = cache
+        self.latencies_ms = []
+        self.retries = 0
+        self.elapsed_s = 0.0
+
+    def payload(self, prompt):
+        return {
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature
+        }
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff_s * 2 ** attempt + random.uniform(0, self.backoff_s)
+
+    async def _complete(self, client, semaphore, bucket, prompt):
+        """Send one prompt; returns a dict with response_text, duration_ms, attempts, cached, error (None on success),
+        and the finish_reason and usage.completion_tokens of the reply (None if the API did not report them)."""
+        key = None
+        if self.cache is not None:
+            key = cache_key(self.model, self.temperature, self.max_tokens, prompt)
+            entry = self.cache.get(key)
+            if entry is not None:
+                return {'response_text': entry['response_text'], 'duration_ms': entry['duration_ms'],
+                        'attempts': 0, 'cached': True, 'error': None,
+                        'finish_reason': entry.get('finish_reason'), 'completion_tokens': entry.get('completion_tokens')}
+
+        async with semaphore:
+            error = None
+            for attempt in range(self.max_retries + 1):
+                if bucket is not None:
+                    await bucket.acquire()
+                start_time = time.perf_counter()
+                response = None
+                try:
+                    response = await client.post(self.api_url, json=self.payload(prompt))
+                except RETRY_ERRORS as e:
+                    error = f"Error: {type(e).__name__}, {e}"
+                except httpx.HTTPError as e:
+                    error = f"Error: {type(e).__name__}, {e}"
+                    break
+                duration_ms = round((time.perf_counter() - start_time) * 1000, 2)
+
+                if response is not None and response.status_code == 200:
+                    try:
+                        reply = response.json()
+                        choice = reply['choices'][0]
+                        response_text = choice['message']['content'].strip()
+                        finish_reason = choice.get('finish_reason')
+                        completion_tokens = (reply.get('usage') or {}).get('completion_tokens')
+                    except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                        # Malformed reply (not JSON, no choices, null content): this prompt fails, the batch goes on
+                        error = f"Error: malformed response, {type(e).__name__}: {e}; {response.text[:200]}"
+                        break
+                    self.latencies_ms.append(duration_ms)
+                    if key is not None:
+                        self.cache.put(key, {'model': self.model, 'response_text': response_text,
+                                             'duration_ms': duration_ms, 'finish_reason': finish_reason,
+                                             'completion_tokens': completion_tokens})
+                    return {'response_text': response_text, 'duration_ms': duration_ms,
+                            'attempts': attempt + 1, 'cached': False, 'error': None,
+                            'finish_reason': finish_reason, 'completion_tokens': completion_tokens}
+
+                if response is not None:
+                    error = f"Error: {response.status_code}, {response.text}"
+                    if response.status_code not in RETRY_STATUSES:
+                        break
+                if attempt < self.max_retries:
+                    self.retries += 1
+                    await asyncio.sleep(self._backoff(attempt, response))
+
+            return {'response_text': error, 'duration_ms': -1, 'attempts': attempt + 1, 'cached': False, 'error': error,
+                    'finish_reason': None, 'completion_tokens': None}
+
+    async def complete_all(self, prompts, on_result=None):
+        """Send all prompts concurrently; `on_result(i, result)` is called as each one finishes."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = TokenBucket(self.rate, self.burst) if self.rate else None
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+        limits = httpx.Limits(max_connections=self.concurrency)
+
+        # With a cache, positions holding the same request share one call: {key: [positions]}
+        groups = {}
+        for i, prompt in enumerate(prompts):
+            key = cache_key(self.model, self.temperature, self.max_tokens, prompt) if self.cache is not None else i
+            groups.setdefault(key, []).append(i)
+
+        results = [None] * len(prompts)
+        async with httpx.AsyncClient(headers=headers, timeout=self.timeout_s, limits=limits) as client:
+            async def run_group(positions):
+                result = await self._complete(client, semaphore, bucket, prompts[positions[0]])
+                for n, i in enumerate(positions):
+                    if n:
+                        # Duplicates are answered by the first position's reply, like a cache hit
+                        result = {**result, 'attempts': 0, 'cached': result['error'] is None}
+                        if result['cached']:
+                            self.cache.hits += 1
+                    results[i] = result
+                    if on_result is not None:
+                        on_result(i, result)
+
+            start_time = time.perf_counter()
+            await asyncio.gather(*(run_group(positions) for positions in groups.values()))
+            self.elapsed_s += time.perf_counter() - start_time
+        return results
+
+    def run(self, prompts, on_result=None):
+        """Blocking wrapper around complete_all()."""
+        return asyncio.run(self.complete_all(prompts, on_result))
+
+    def stats(self):
+        """Throughput (successful API rewrites/sec), per-request latency percentiles in ms, and cache counters."""
+        latencies = sorted(self.latencies_ms)
+        stats = {
+            'requests': len(latencies),
+            'retries': self.retries,
+            'elapsed_s': round(self.elapsed_s, 2),
+            'throughput_per_s': round(len(latencies) / self.elapsed_s, 3) if self.elapsed_s else 0.0,
+        }
+        if latencies:
+            cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+            stats.update({'p50_ms': cuts[49], 'p90_ms': cuts[89], 'p99_ms': cuts[98], 'max_ms': latencies[-1]})
+        if self.cache is not None:
+            stats.update({f'cache_{name}': value for name, value in self.cache.stats().items()})
+        return stats
+
+    def report(self):
+        stats = self.stats()
+        line = (f"Rewrites: {stats['requests']} in {stats['elapsed_s']} s "
+                f"({stats['throughput_per_s']} rewrites/sec, {stats['retries']} retries)")
+        if 'p50_ms' in stats:
+            line += f"; latency p50={stats['p50_ms']:.0f} ms, p90={stats['p90_ms']:.0f} ms, p99={stats['p99_ms']:.0f} ms"
+        if self.cache is not None:
+            line += f"; cache hits={stats['cache_hits']}, misses={stats['cache_misses']}"
+        print(line)
@@ -0,0 +1,270 @@
+"""
+Parsing of EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) output.
+
+- plan_summary(): execution/planning time, root cost and rows of one run
+- node_metrics(): one row of metrics per plan node (columnar plan table)
+- plan_hash(): hash of the plan shape (operators and estimates, no run-time values),
+  so repeated runs of the same plan are stored once in a PlanStore; the stored plan has
+  its run-time values removed (strip_runtime()), since it stands for every run and query
+  with that shape; per-run values go to the node metrics table and the result columns
+- plan_text(): compact text rendering of a JSON plan, e.g. for LLM prompts
+- compact_plan_text(): shorter rendering for prompts with a token budget: repeated sibling
+  subtrees collapsed, only the most expensive nodes kept, no detail lines on zero-cost nodes
+"""
+
+import hashlib
+import json
+import os
+
+from result_store import append_csv_rows, append_jsonl, repair_jsonl
+
+# Node properties that define the shape of a plan; actual (run-time) values are excluded
+SHAPE_KEYS = (
+    "Node Type", "Parent Relationship", "Strategy", "Join Type", "Relation Name", "Alias",
+    "Index Name", "Scan Direction", "Startup Cost", "Total Cost", "Plan Rows", "Plan Width",
+    "Hash Cond", "Merge Cond", "Index Cond", "Recheck Cond", "Filter", "Join Filter",
+    "Sort Key", "Group Key", "Subplan Name",
+)
+
+# Plan and node properties that describe one execution rather than the plan
+RUNTIME_KEYS = ("Planning Time", "Execution Time", "Planning", "Triggers", "JIT")
+RUNTIME_KEY_PREFIXES = (
+    "Actual ", "Rows Removed by ", "Heap Fetches", "Shared ", "Local ", "Temp ", "I/O ", "WAL ",
+    "Sort Method", "Sort Space ", "Peak Memory Usage", "Hash Buckets", "Original Hash Buckets",
+    "Hash Batches", "Original Hash Batches", "Exact Heap Blocks", "Lossy Heap Blocks", "Workers Launched",
+)
+RUNTIME_NODE_KEYS = ("Workers",)  # Per-worker actuals; "Workers Planned" is part of the plan
+
+# Nodes whose own cost (total minus children) is below this are rendered without condition/filter details
+ZERO_COST = 0.01
+
+# Detail lines of EXPLAIN text plans dropped by compact_text_plan()
+TEXT_DETAIL_PREFIXES = ("Buffers:", "I/O Timings:", "Planning:", "Worker ", "Output:")
+
+# Side files written next to a results CSV
+PLAN_STORE_SUFFIX = ".plans.jsonl"  # Distinct JSON plans, referenced by the plan_hash_i columns
+PLAN_NODES_SUFFIX = ".plan_nodes.csv"  # Per-node metrics of every run
+
+NODE_COLUMNS = [
+    "node_id", "parent_id", "depth", "node_type", "relation_name",
+    "total_cost", "plan_rows", "actual_rows", "actual_loops",
+    "shared_hit_blocks", "shared_read_blocks",
+]
+
+# Columns of the per-run node table written by append_node_metrics()
+NODE_TABLE_COLUMNS = ["run", "plan_hash"] + NODE_COLUMNS
+
+
+def load_explain(result):
+    """Return the top-level plan object from the single EXPLAIN (FORMAT JSON) result value."""
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0] if isinstance(result, list) else result
+
+
+def iter_nodes(plan, depth=0, parent_id=None, counter=None):
+    """Yield (node_id, parent_id, depth, node) in depth-first order."""
+    counter = counter if counter is not None else [0]
+    node_id = counter[0]
+    counter[0] += 1
+    yield node_id, parent_id, depth, plan
+    for child in plan.get("Plans", []):
+        yield from iter_nodes(child, depth + 1, node_id, counter)
+
+
+def plan_summary(explain):
+    """Run-level metrics: execution and planning time (ms), root total cost and actual rows."""
+    root = explain["Plan"]
+    return {
+        "execution_time": explain.get("Execution Time"),
+        "planning_time": explain.get("Planning Time"),
+        "total_cost": root.get("Total Cost"),
+        "actual_rows": root.get("Actual Rows"),
+        "shared_hit_blocks": root.get("Shared Hit Blocks"),
+        "shared_read_blocks": root.get("Shared Read Blocks"),
+    }
+
+
+def node_metrics(explain):
+    """Per-node metrics: node type, estimated vs. actual rows, loops and shared buffer hits/reads."""
+    rows = []
+    for node_id, parent_id, depth, node in iter_nodes(explain["Plan"]):
+        rows.append({
+            "node_id": node_id,
+            "parent_id": parent_id,
+            "depth": depth,
+            "node_type": node.get("Node Type"),
+            "relation_name": node.get("Relation Name"),
+            "total_cost": node.get("Total Cost"),
+            "plan_rows": node.get("Plan Rows"),
+            "actual_rows": node.get("Actual Rows"),
+            "actual_loops": node.get("Actual Loops"),
+            "shared_hit_blocks": node.get("Shared Hit Blocks"),
+            "shared_read_blocks": node.get("Shared Read Blocks"),
+        })
+    return rows
+
+
+def plan_shape(plan):
+    """Strip run-time values from a plan node tree."""
+    shape = {key: plan[key] for key in SHAPE_KEYS if key in plan}
+    if "Plans" in plan:
+        shape["Plans"] = [plan_shape(child) for child in plan["Plans"]]
+    return shape
+
+
+def strip_runtime(explain):
+    """Copy of an EXPLAIN result without run-time values (actual rows and times, buffers, planning/execution time)."""
+    def strip(node):
+        node = {key: value for key, value in node.items()
+                if key not in RUNTIME_NODE_KEYS and not key.startswith(RUNTIME_KEY_PREFIXES)}
+        if "Plans" in node:
+            node["Plans"] = [strip(child) for child in node["Plans"]]
+        return node
+
+    stripped = {key: value for key, value in explain.items() if key not in RUNTIME_KEYS and key != "Plan"}
+    stripped["Plan"] = strip(explain["Plan"])
+    return stripped
+
+
+def plan_hash(explain):
+    shape = json.dumps(plan_shape(explain["Plan"]), sort_keys=True)
+    return hashlib.sha256(shape.encode("utf-8")).hexdigest()[:16]
+
+
+def _node_line(node):
+    line = node.get("Node Type", "?")
+    if "Relation Name" in node:
+        line += f" on {node['Relation Name']}"
+        if node.get("Alias") and node["Alias"] != node["Relation Name"]:
+            line += f" {node['Alias']}"
+    line += f"  (cost={node.get('Startup Cost', 0):.2f}..{node.get('Total Cost', 0):.2f} rows={node.get('Plan Rows')})"
+    if "Actual Rows" in node:
+        line += f" (actual rows={node['Actual Rows']} loops={node.get('Actual Loops')})"
+    return line
+
+
+def plan_text(explain):
+    """Render a JSON plan in the familiar indented EXPLAIN text layout (without per-node details)."""
+    lines = []
+    for _, _, depth, node in iter_nodes(explain["Plan"]):
+        prefix = " " * (6 * depth - 4) + "->  " if depth else ""
+        lines.append(prefix + _node_line(node))
+        for key in ("Hash Cond", "Merge Cond", "Index Cond", "Filter", "Join Filter"):
+            if key in node:
+                lines.append(" " * (6 * depth + 2) + f"{key}: {node[key]}")
+    if explain.get("Planning Time") is not None:
+        lines.append(f"Planning Time: {explain['Planning Time']:.3f} ms")
+    if explain.get("Execution Time") is not None:
+        lines.append(f"Execution Time: {explain['Execution Time']:.3f} ms")
+    return "\n".join(lines)
+
+
+def own_cost(node):
+    """Cost of a node itself: its total cost minus the total cost of its children."""
+    children = sum(child.get("Total Cost", 0) for child in node.get("Plans", []))
+    return max(node.get("Total Cost", 0) - children, 0)
+
+
+def compact_plan_text(explain, top_nodes=20):
+    """plan_text() for prompts: the top_nodes most expensive nodes (by own cost) and their ancestors,
+    identical sibling subtrees shown once with a repeat count, omitted subtrees summarized in one line."""
+    nodes = list(iter_nodes(explain["Plan"]))
+    parents = {node_id: parent_id for node_id, parent_id, _, _ in nodes}
+    ranked = sorted(nodes, key=lambda item: own_cost(item[3]), reverse=True)
+    keep = {0}
+    for node_id, _, _, _ in ranked[:top_nodes]:
+        while node_id is not None and node_id not in keep:
+            keep.add(node_id)
+            node_id = parents[node_id]
+    ids = {id(node): node_id for node_id, _, _, node in nodes}
+
+    lines = []
+
+    # Two spaces per level instead of six: deep plans are mostly indentation otherwise
+    def render(node, depth, repeat=1):
+        prefix = "  " * (depth - 1) + "-> " if depth else ""
+        lines.append(prefix + _node_line(node) + (f"  x{repeat}" if repeat > 1 else ""))
+        if own_cost(node) >= ZERO_COST:
+            for key in ("Hash Cond", "Merge Cond", "Index Cond", "Filter", "Join Filter"):
+                if key in node:
+                    lines.append("  " * depth + f"   {key}: {node[key]}")
+
+        # Runs of identical sibling subtrees are rendered once
+        groups = []
+        for child in node.get("Plans", []):
+            shape = json.dumps(plan_shape(child), sort_keys=True)
+            if groups and groups[-1][0] == shape:
+                groups[-1][2] += 1
+            else:
+                groups.append([shape, child, 1])
+
+        omitted = omitted_cost = 0
+        for _, child, count in groups:
+            if ids[id(child)] in keep:
+                render(child, depth + 1, count)
+            else:
+                subtree = [item[3] for item in iter_nodes(child)]
+                omitted += len(subtree) * count
+                omitted_cost += sum(own_cost(n) for n in subtree) * count
+        if omitted:
+            lines.append("  " * depth + f"-> ... {omitted} cheaper nodes omitted (cost {omitted_cost:.2f})")
+
+    render(explain["Plan"], 0)
+    if explain.get("Execution Time") is not None:
+        lines.append(f"Execution Time: {explain['Execution Time']:.3f} ms")
+    return "\n".join(lines)
+
+
+def compact_text_plan(text):
+    """Shorten a legacy EXPLAIN text plan: drop buffer/worker/output detail lines and repeated lines."""
+    lines = []
+    for line in str(text).splitlines():
+        if line.strip().startswith(TEXT_DETAIL_PREFIXES) or (lines and line == lines[-1]):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class PlanStore:
+    """Append-only JSONL file holding each distinct plan once, keyed by plan_hash(), without run-time values.
+    Writes are fsynced and a line left half-written by a crash is dropped on open, as in ResultStore."""
+
+    def __init__(self, path):
+        self.path = path
+        self.plans = {}
+        repair_jsonl(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    # Plans stored before strip_runtime() existed carry the values of their first run
+                    self.plans[record["hash"]] = strip_runtime(record["plan"])
+
+    def add(self, explain):
+        """Store a plan unless one with the same shape is already stored; return its hash."""
+        digest = plan_hash(explain)
+        if digest not in self.plans:
+            self.plans[digest] = strip_runtime(explain)
+            append_jsonl(self.path, {"hash": digest, "plan": self.plans[digest]})
+        return digest
+
+    def get(self, digest):
+        return self.plans.get(digest)
+
+    def text(self, value, default="N/A", top_nodes=None):
+        """Resolve a plan hash to plan text (compacted if top_nodes is given); legacy text plans are returned as is."""
+        if not isinstance(value, str) or not value:
+            return default
+        explain = self.plans.get(value)
+        if explain is None:
+            return compact_text_plan(value) if top_nodes else value
+        return compact_plan_text(explain, top_nodes) if top_nodes else plan_text(explain)
+
+
+def append_node_metrics(path, key_values, nodes):
+    """Append per-node metric rows (with run and plan_hash), prefixed with identifying columns, to a CSV table."""
+    append_csv_rows(path, list(key_values) + NODE_TABLE_COLUMNS, ({**key_values, **node} for node in nodes))
@@ -0,0 +1,57 @@
+"""
+Token counting and per-request prompt statistics for LLM rewriters.
+
+Tokens are counted with tiktoken when it is installed (the model's encoding, else
+cl100k_base); without it a heuristic of CHARS_PER_TOKEN characters per token is used.
+Every request appends one row to a CSV (PROMPT_STATS_COLUMNS), so latency can be
+plotted against prompt size; completion tokens and truncation (finish_reason 'length')
+are taken from the API reply rather than counted.
+"""
+
+import math
+
+from result_store import append_csv_rows
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Heuristic for English text and SQL without tiktoken
+CHARS_PER_TOKEN = 4
+
+# Prompt size the rewriters aim for; plans are compacted further until the prompt fits
+PROMPT_TOKEN_BUDGET = 3000
+
+# Plan nodes kept at each compaction step (the most expensive ones by own cost)
+PLAN_TOP_NODES = (25, 12, 6)
+
+PROMPT_STATS_COLUMNS = [
+    'Id', 'TaskNo', 'ResponseId', 'prompt_tokens', 'plan_tokens', 'schema_tables', 'plan_top_nodes',
+    'within_budget', 'completion_tokens', 'truncated', 'duration_ms', 'cached', 'error', 'token_counter',
+    'finish_reason',
+]
+
+_encodings = {}
+
+
+def token_counter():
+    return 'tiktoken' if tiktoken is not None else 'heuristic'
+
+
+def count_tokens(text, model=None):
+    """Number of tokens of a text for a model (estimated without tiktoken)."""
+    text = str(text or '')
+    if tiktoken is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except (KeyError, ValueError):
+            _encodings[model] = tiktoken.get_encoding('cl100k_base')
+    return len(_encodings[model].encode(text, disallowed_special=()))
+
+
+def append_prompt_stats(path, stats):
+    """Append the statistics of one request to the prompt statistics CSV."""
+    append_csv_rows(path, PROMPT_STATS_COLUMNS, [stats])
@@ -1,93 +1,282 @@
+import argparse
+import datetime
+import decimal
+import hashlib
+import json
+import multiprocessing as mp
+from collections import Counter
+
 import pandas as pd
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import errors
 
-# Database connection parameters
-DB_CONFIG = {
-    "dbname": "leetcode_uniform",
-    "user": "postgres",
-    "password": "",
-    "host": "localhost",
-    "port": "5432",
-}
+from checkpoint import Checkpoint
+from db_config import DB_CONFIG
 
 # Path to CSV file with queries
 QUERY_FILE = "/home/kseniia/Documents/data/ChatGPT_vs_Initial_queries_row_comparison.csv"
 
-# Connect to PostgreSQL database
-conn = psycopg2.connect(**DB_CONFIG)
-cursor = conn.cursor(cursor_factory=RealDictCursor)
+# Checkpoint manifest with per-row verdicts; finished rows with unchanged queries are skipped on restart
+STORE_SUFFIX = ".results.jsonl"
+TOOL = "equivalence"
 
-# Load query comparison file
-df = pd.read_csv(QUERY_FILE)
+# Number of worker processes; each has its own connection and verifies one pair at a time
+N_WORKERS = 4
 
-# Ensure required columns exist
-for col in ['ordered_equal', 'except_equal']:
-    if col not in df.columns:
-        df[col] = ''
+# Results are streamed through a server-side cursor in batches of this many rows
+FETCH_SIZE = 10000
 
-def normalize_df(rows):
-    """Convert query result into a normalized DataFrame with standard column names."""
-    df = pd.DataFrame(rows)
-    df.columns = [f"col{i}" for i in range(len(df.columns))]
-    return df
+# Order-insensitive digest: sum of row hashes modulo 2^256 (a multiset hash, duplicates count)
+DIGEST_MODULUS = 2 ** 256
 
-def compare_as_sets(query1, query2):
-    """Compare two query results as unordered sets."""
-    try:
-        cursor.execute(query1)
-        res1 = normalize_df(cursor.fetchall())
+# Number of differing rows printed when digests disagree
+DIFF_SAMPLE = 5
 
-        cursor.execute(query2)
-        res2 = normalize_df(cursor.fetchall())
+# How the order-insensitive verdict is decided:
+#   "stream" - both results are streamed and compared by digest
+#   "except" - PostgreSQL evaluates (q1 EXCEPT ALL q2) UNION ALL (q2 EXCEPT ALL q1) and, only if
+#              that is empty, the same check on the rows numbered in result order;
+#              no rows cross the wire either way. Pairs it cannot evaluate (e.g. column count
+#              or type mismatch) fall back to "stream"
+VERDICT_MODES = ("stream", "except")
+VERDICT_MODE = "except"
 
-        if res1.shape[1] != res2.shape[1]:
-            print(f"Column count mismatch: {res1.shape[1]} vs {res2.shape[1]}")
-            return "COLUMN_MISMATCH"
+# Statement timeout for each query of a pair (ms); a timed-out pair gets the verdict TIMEOUT
+PAIR_TIMEOUT_MS = 300000
 
-        set1 = set(map(tuple, res1.values))
-        set2 = set(map(tuple, res2.values))
-        return "TRUE" if set1 == set2 else "FALSE"
+# Each query runs once: the CTEs are materialized and read by both EXCEPT ALL branches and,
+# if the multisets are equal, by the positional check, which numbers the rows in the order the
+# query returned them (row_number() OVER () follows the scan order of the CTE) and compares
+# (position, row) pairs by value, so 2.50 and 2.5000 or a date and a timestamp still match.
+# NULL means the multisets differ. The queries are spliced in by concatenation, since they may contain braces.
+NUMBERED = "(SELECT row_number() OVER (), * FROM {cte})"
+EXCEPT_QUERY = """WITH q1 AS MATERIALIZED (
+__QUERY1__
+), q2 AS MATERIALIZED (
+__QUERY2__
+)
+SELECT CASE
+    WHEN EXISTS ((TABLE q1 EXCEPT ALL TABLE q2) UNION ALL (TABLE q2 EXCEPT ALL TABLE q1)) THEN NULL
+    ELSE NOT EXISTS ((%s EXCEPT ALL %s) UNION ALL (%s EXCEPT ALL %s))
+END""" % (NUMBERED.format(cte="q1"), NUMBERED.format(cte="q2"), NUMBERED.format(cte="q2"), NUMBERED.format(cte="q1"))
 
-    except Exception as e:
-        print(f"Error comparing queries:\nQuery 1:\n{query1}\nQuery 2:\n{query2}\n{e}")
-        return "ERROR"
 
-# Main comparison loop
-for idx, row in df.iterrows():
-    init_query = row['Initial Query']
-    opt_query = row['Optimized query']
+def canonical(value):
+    """Canonical JSON-serializable form of a result value, so equal values hash equally across types."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float, decimal.Decimal)):
+        if isinstance(value, float) and value != value:
+            return "NaN"
+        number = decimal.Decimal(repr(value) if isinstance(value, float) else value).normalize()
+        return format(number, "f")
+    if isinstance(value, (datetime.date, datetime.time, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, memoryview):
+        return value.hex()
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    return str(value)
 
-    print(f"Comparing row {idx + 1}/{len(df)}")
 
-    try:
-        # Ordered result comparison
-        cursor.execute(init_query)
-        rows_init = [tuple(r.values()) for r in cursor.fetchall()]
+def row_digest(row):
+    payload = json.dumps([canonical(v) for v in row], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).digest()
+
+
+def stream_rows(conn, query, name):
+    """Yield result rows of a query through a named (server-side) cursor; the first item is the column count."""
+    with conn.cursor(name=name) as cursor:
+        cursor.itersize = FETCH_SIZE
+        cursor.execute(query)
+        rows = iter(cursor)
+        first = next(rows, None)
+        yield len(cursor.description) if cursor.description else 0
+        if first is not None:
+            yield first
+            yield from rows
+
+
+def result_digest(conn, query, name):
+    """Run a query once and return its column and row counts, ordered digest and multiset digest."""
+    rows = stream_rows(conn, query, name)
+    columns = next(rows)
+    ordered = hashlib.sha256()
+    multiset = 0
+    count = 0
+    for row in rows:
+        digest = row_digest(row)
+        ordered.update(digest)
+        multiset = (multiset + int.from_bytes(digest, "big")) % DIGEST_MODULUS
+        count += 1
+    return {"columns": columns, "rows": count, "ordered": ordered.hexdigest(), "multiset": multiset}
+
+
+def diff_results(conn, query1, query2):
+    """Detailed comparison, only run when digests disagree: count rows missing from either side."""
+    counts = Counter()
+    for sign, query, name in ((1, query1, "diff_init"), (-1, query2, "diff_opt")):
+        rows = stream_rows(conn, query, name)
+        next(rows)
+        for row in rows:
+            counts[tuple(canonical(v) for v in row)] += sign
+    only_init = [(row, n) for row, n in counts.items() if n > 0]
+    only_opt = [(row, -n) for row, n in counts.items() if n < 0]
+    for label, rows in (("initial", only_init), ("optimized", only_opt)):
+        for row, n in rows[:DIFF_SAMPLE]:
+            print(f"  only in {label} (x{n}): {row}")
+    return {"only_init": sum(n for _, n in only_init), "only_opt": sum(n for _, n in only_opt)}
+
+
+def strip_query(query):
+    return query.strip().rstrip(";").strip()
+
+
+def except_equal_in_db(conn, init_query, opt_query):
+    """Multiset and ordered equality evaluated by PostgreSQL: (multiset_equal, ordered_equal), where
+    ordered_equal is None if the multisets differ; None if the pair cannot be compared with EXCEPT ALL."""
+    with conn.cursor() as cursor:
+        cursor.execute("SAVEPOINT except_check")
+        try:
+            head, rest = EXCEPT_QUERY.split("__QUERY1__")
+            middle, tail = rest.split("__QUERY2__")
+            cursor.execute(head + strip_query(init_query) + middle + strip_query(opt_query) + tail)
+            ordered = cursor.fetchone()[0]
+        except errors.QueryCanceled:
+            raise
+        except psycopg2.Error as e:
+            print(f"EXCEPT ALL check not applicable, streaming results instead: {str(e).strip()}")
+            cursor.execute("ROLLBACK TO SAVEPOINT except_check")
+            return None
+        cursor.execute("RELEASE SAVEPOINT except_check")
+    return ordered is not None, ordered
+
+
+def compare_pair(conn, init_query, opt_query, mode=VERDICT_MODE, timeout_ms=PAIR_TIMEOUT_MS):
+    """Compare two queries: ordered and order-insensitive (multiset) verdicts and the mode that decided the latter."""
+    with conn.cursor() as cursor:
+        cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+
+    if mode == "except":
+        verdict = except_equal_in_db(conn, init_query, opt_query)
+        if verdict is not None:
+            equal, ordered = verdict
+            return ("TRUE" if ordered else "FALSE"), ("TRUE" if equal else "FALSE"), "except"
 
-        cursor.execute(opt_query)
-        rows_opt = [tuple(r.values()) for r in cursor.fetchall()]
+    init = result_digest(conn, init_query, "cmp_init")
+    opt = result_digest(conn, opt_query, "cmp_opt")
 
-        ordered_equal = "TRUE" if rows_init == rows_opt else "FALSE"
+    if init["columns"] != opt["columns"]:
+        print(f"Column count mismatch: {init['columns']} vs {opt['columns']}")
+        return "FALSE", "COLUMN_MISMATCH", "stream"
 
-        # Unordered set comparison
-        except_equal = compare_as_sets(init_query, opt_query)
+    ordered_equal = "TRUE" if init["ordered"] == opt["ordered"] and init["rows"] == opt["rows"] else "FALSE"
+    except_equal = "TRUE" if init["multiset"] == opt["multiset"] and init["rows"] == opt["rows"] else "FALSE"
 
+    if except_equal == "FALSE":
+        diff = diff_results(conn, init_query, opt_query)
+        print(f"Rows: {init['rows']} vs {opt['rows']}; only in initial: {diff['only_init']}, "
+              f"only in optimized: {diff['only_opt']}")
+    return ordered_equal, except_equal, "stream"
+
+
+def verify_pair(conn, init_query, opt_query, label="", mode=VERDICT_MODE, timeout_ms=PAIR_TIMEOUT_MS):
+    """Verify one pair in its own read-only transaction, which is always rolled back; returns (values, status)."""
+    try:
+        ordered_equal, except_equal, verdict_mode = compare_pair(conn, init_query, opt_query, mode, timeout_ms)
+    except errors.QueryCanceled:
+        print(f"{label} Timeout after {timeout_ms} ms")
+        ordered_equal, except_equal, verdict_mode = "TIMEOUT", "TIMEOUT", mode
     except Exception as e:
-        print(f"Error processing row {idx + 1}: {e}")
-        ordered_equal = "ERROR"
-        except_equal = "ERROR"
+        print(f"{label} Error: {e}")
+        ordered_equal, except_equal, verdict_mode = "ERROR", "ERROR", mode
+    finally:
+        # Nothing is committed; an error in this pair cannot leave the transaction aborted for the next one
+        conn.rollback()
+
+    status = {"ERROR": "error", "TIMEOUT": "timeout"}.get(except_equal, "ok")
+    print(f"{label} Result: ordered = {ordered_equal}, multiset = {except_equal} ({verdict_mode})")
+    return {'ordered_equal': ordered_equal, 'except_equal': except_equal, 'verdict_mode': verdict_mode}, status
+
+
+def connect():
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.set_session(readonly=True)
+    return conn
+
+
+# === Worker processes: each holds its own read-only connection ===
+_worker_conn = None
+_mode = VERDICT_MODE
+_timeout_ms = PAIR_TIMEOUT_MS
+
+def _init_worker(mode, timeout_ms):
+    global _worker_conn, _mode, _timeout_ms
+    _worker_conn = connect()
+    _mode = mode
+    _timeout_ms = timeout_ms
+
+def _verify_task(task):
+    index, label, init_query, opt_query = task
+    values, status = verify_pair(_worker_conn, init_query, opt_query, label, _mode, _timeout_ms)
+    return index, values, status
+
+
+def run_comparison(query_file=QUERY_FILE, n_workers=N_WORKERS, mode=VERDICT_MODE, timeout_ms=PAIR_TIMEOUT_MS,
+                   store_file=None):
+    if mode not in VERDICT_MODES:
+        raise ValueError(f"Unsupported verdict mode: {mode} (expected one of {VERDICT_MODES})")
+
+    # Load query comparison file
+    df = pd.read_csv(query_file)
+    store = Checkpoint(store_file or query_file + STORE_SUFFIX, TOOL)
+
+    tasks = []
+    rows = {}
+    for idx, row in df.iterrows():
+        init_query = row['Initial Query']
+        opt_query = row['Optimized query']
+        if store.is_done(row, init_query, opt_query):
+            continue
+        rows[idx] = (row, init_query, opt_query)
+        tasks.append((idx, f"[Row {idx + 1}/{len(df)}]", init_query, opt_query))
+    print(f"Comparing {len(tasks)} of {len(df)} pairs ({len(df) - len(tasks)} already verified)")
+
+    def save(index, values, status):
+        # Append the verdict of this row to the checkpoint
+        row, init_query, opt_query = rows[index]
+        store.record(row, values, status, init_query, opt_query)
+
+    if n_workers <= 1:
+        conn = connect()
+        try:
+            for index, label, init_query, opt_query in tasks:
+                save(index, *verify_pair(conn, init_query, opt_query, label, mode, timeout_ms))
+        finally:
+            conn.close()
+    else:
+        with mp.Pool(processes=n_workers, initializer=_init_worker, initargs=(mode, timeout_ms)) as pool:
+            for index, values, status in pool.imap_unordered(_verify_task, tasks):
+                save(index, values, status)
+
+    # Write all verdicts into the comparison CSV
+    store.materialize(query_file, columns=['ordered_equal', 'except_equal', 'verdict_mode'])
+    print("Query comparison completed. Results saved to file.")
 
-    # Save results
-    df.at[idx, 'ordered_equal'] = ordered_equal
-    df.at[idx, 'except_equal'] = except_equal
 
-    print(f"Result: ordered = {ordered_equal}, set-based = {except_equal}")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check result equivalence of initial and optimized queries.")
+    parser.add_argument("--file", type=str, default=QUERY_FILE, help="Comparison CSV (verdicts are written back)")
+    parser.add_argument("--workers", type=int, default=N_WORKERS, help="Number of worker processes, each with its own connection")
+    parser.add_argument("--mode", type=str, default=VERDICT_MODE, choices=VERDICT_MODES,
+                        help="stream: compare digests of streamed results; except: EXCEPT ALL evaluated by PostgreSQL")
+    parser.add_argument("--timeout", type=int, default=PAIR_TIMEOUT_MS, help="Statement timeout per query of a pair (ms)")
+    parser.add_argument("--store", type=str, default=None, help=f"Checkpoint manifest (default: <file>{STORE_SUFFIX})")
+    return parser.parse_args()
 
-    # Save CSV after each iteration
-    df.to_csv(QUERY_FILE, index=False)
 
-# Close DB connection
-cursor.close()
-conn.close()
-print("Query comparison completed. Results saved to file.")
+if __name__ == "__main__":
+    args = parse_args()
+    run_comparison(args.file, args.workers, args.mode, args.timeout, args.store)
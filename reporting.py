@@ -0,0 +1,339 @@
+"""
+Figures of query outcomes and execution times for the initial queries and every tool.
+
+All aggregates are computed in one pass per result table:
+- per task:        successful / failed queries per LeetCode task
+- per difficulty:  successful / failed queries per difficulty level
+- per time range:  successful queries per avg_pg_time bucket
+A query failed if it has no avg_pg_time (no run succeeded) or timed out, as in the original
+plots; queries with only some failed runs ("partial") count as successful.
+The aggregates are cached in plots/report_cache.jsonl keyed by a fingerprint of the result
+file (size and modification time), so unchanged tables are not read again. Every figure
+records a digest of the aggregates it was drawn from and is skipped while its
+inputs and its output file are unchanged.
+
+Figures:
+- Initial_results/plots/queries_by_{task,difficulty,timerange}.png  initial queries
+- plots/cross_tool_by_{task,difficulty,timerange}.png               initial queries and every tool
+
+    python reporting.py --root .
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from analysis import INITIAL_FILE, TOOLS
+from columnar import has_parquet, parquet_paths, read_results
+from result_schema import migrate
+from result_store import ResultStore
+
+INITIAL = 'Initial'
+
+PLOTS_DIR = 'plots'
+INITIAL_PLOTS_DIR = os.path.join('Initial_results', 'plots')
+CACHE_FILE = 'report_cache.jsonl'
+
+COLUMNS = ['TaskNo', 'Difficulty', 'avg_pg_time', 'status']
+
+# Part of the aggregate fingerprints; bump when aggregate() changes, so cached aggregates are recomputed
+AGGREGATE_VERSION = 2
+
+DIFFICULTY_LEVELS = ['Easy', 'Medium', 'Hard']
+
+# Execution time ranges (ms); the last range is open-ended
+TIME_BINS = [0, 10, 20, 30, 40, 50, 100, 200, 300, 500, 1000, np.inf]
+TIME_LABELS = ['0–10', '10–20', '20–30', '30–40', '40–50',
+               '50–100', '100–200', '200–300', '300–500', '500–1000', '1000+']
+
+# Colors for visualization
+COLORS = {
+    'success': '#7F86BC',
+    'error': '#F8D56F'
+}
+SOURCE_COLORS = ['#7F86BC', '#F8D56F', '#8CC084', '#E58F84', '#9FC9E0', '#C7A2D6']
+
+
+# === Aggregates ===
+def result_file(root, source):
+    if source == INITIAL:
+        return os.path.join(root, INITIAL_FILE)
+    return os.path.join(root, source, f'{source}_raw_results.csv')
+
+
+def fingerprint(path):
+    """Size and modification time of the file read_results() loads for a result table, and AGGREGATE_VERSION."""
+    data_path = parquet_paths(path)[0] if has_parquet(path) else path
+    stat = os.stat(data_path)
+    return f'{os.path.basename(data_path)}:{stat.st_size}:{stat.st_mtime_ns}:v{AGGREGATE_VERSION}'
+
+
+def load(path):
+    try:
+        return read_results(path, columns=COLUMNS)
+    except ValueError:
+        # Tables written before the status column existed are migrated in memory
+        print(f'{path} has no status column, deriving it (run result_schema.py to migrate the file)')
+        return migrate(read_results(path))[COLUMNS]
+
+
+def aggregate(df):
+    """Success / error counts per task and difficulty and successful queries per time range."""
+    is_error = df['avg_pg_time'].isna() | (df['status'] == 'timeout')
+    counts = pd.DataFrame({'success': ~is_error, 'error': is_error})
+
+    by_task = counts.groupby(df['TaskNo'].astype(int)).sum().sort_index()
+    by_difficulty = counts.groupby(df['Difficulty']).sum().reindex(DIFFICULTY_LEVELS, fill_value=0)
+    times = df.loc[~is_error, 'avg_pg_time'].dropna()
+    by_timerange = pd.cut(times, bins=TIME_BINS, labels=TIME_LABELS, right=False).value_counts()
+
+    return {
+        'total': len(df),
+        'success': int((~is_error).sum()),
+        'error': int(is_error.sum()),
+        'by_task': [[int(task), int(row.success), int(row.error)] for task, row in by_task.iterrows()],
+        'by_difficulty': [[level, int(row.success), int(row.error)] for level, row in by_difficulty.iterrows()],
+        'by_timerange': [[label, int(by_timerange.get(label, 0))] for label in TIME_LABELS],
+    }
+
+
+def load_aggregates(root, sources, cache, records, force=False):
+    """Aggregates of every source that has a result table; unchanged tables come from the cache."""
+    aggregates = {}
+    computed = 0
+    for source in sources:
+        path = result_file(root, source)
+        if not (os.path.exists(path) or has_parquet(path)):
+            print(f'[{source}] No raw results found at {path}, skipped')
+            continue
+        key = ('aggregates', source)
+        current = fingerprint(path)
+        record = records.get(key)
+        if record and record.get('fingerprint') == current and not force:
+            aggregates[source] = record['values']
+            continue
+        aggregates[source] = aggregate(load(path))
+        cache.append(key, aggregates[source], fingerprint=current)
+        computed += 1
+    print(f'Aggregates: {computed} result tables read, {len(aggregates) - computed} from cache')
+    return aggregates
+
+
+# === Figures of one source ===
+def summary_box(ax, agg, x=0.99):
+    summary_text = (
+        f"Total queries: {agg['total']}\n"
+        f"Success: {agg['success']}\n"
+        f"Errors: {agg['error']}"
+    )
+    ax.text(x, 0.98, summary_text, transform=ax.transAxes,
+            ha='right', va='top', fontsize=11, fontweight='bold')
+
+
+def plot_by_task(aggregates):
+    agg = aggregates[INITIAL]
+    tasks, success, error = (np.array(values) for values in zip(*agg['by_task']))
+    x = tasks.astype(str)
+
+    fig, ax = plt.subplots(figsize=(18, 8))
+    ax.bar(x, success, label='Success', color=COLORS['success'])
+    ax.bar(x, error, bottom=success, label='Error', color=COLORS['error'])
+
+    # Add counts as labels on bars
+    for i in range(len(x)):
+        if success[i] > 0:
+            ax.text(i, success[i] / 2, str(success[i]), ha='center', va='center', color='black', fontsize=10)
+        if error[i] > 0:
+            ax.text(i, success[i] + error[i] / 2, str(error[i]), ha='center', va='center', color='black', fontsize=10)
+
+    summary_box(ax, agg)
+    ax.set_title('Number of Queries by LeetCode Task', fontsize=16, pad=15)
+    ax.set_xlabel('LeetCode Task No', fontsize=12)
+    ax.set_ylabel('Number of Queries', fontsize=12)
+    ax.set_ylim(0, 140)
+    ax.set_xticks(range(len(x)))
+    ax.set_xticklabels(x, rotation=90, fontsize=10)
+    ax.tick_params(axis='y', labelsize=10)
+    ax.legend(fontsize=10)
+    return fig
+
+
+def plot_by_difficulty(aggregates):
+    agg = aggregates[INITIAL]
+    levels, success, error = (np.array(values) for values in zip(*agg['by_difficulty']))
+    x = range(len(levels))
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.bar(x, success, label='Success', color=COLORS['success'])
+    ax.bar(x, error, bottom=success, label='Error', color=COLORS['error'])
+
+    # Add value labels on top of bars
+    for i in x:
+        total = success[i] + error[i]
+        ax.text(i, total + 5, str(total), ha='center', va='bottom', fontsize=11)
+
+    summary_box(ax, agg, x=0.98)
+    ax.set_title('Number of Queries by Task Difficulty', fontsize=16, pad=15)
+    ax.set_xlabel('Task Difficulty Level', fontsize=12)
+    ax.set_ylabel('Number of Queries', fontsize=12)
+    ax.set_xticks(x)
+    ax.set_xticklabels(levels, fontsize=11)
+    ax.set_ylim(0, max(success + error) + 50)
+    ax.legend(fontsize=10)
+    return fig
+
+
+def plot_by_timerange(aggregates):
+    labels, counts = zip(*aggregates[INITIAL]['by_timerange'])
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    bars = ax.bar(labels, counts, color=COLORS['success'])
+
+    # Add count labels above each bar
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2, height + 2,
+                f'{int(height)}', ha='center', va='bottom', fontsize=10)
+
+    ax.text(0.99, 0.98, f'Total queries: {sum(counts)}',
+            transform=ax.transAxes, ha='right', va='top', fontsize=12, fontweight='bold')
+    ax.set_title('Number of Queries by Execution Time Ranges', fontsize=16, pad=15)
+    ax.set_xlabel('Execution Time Range (ms)', fontsize=12)
+    ax.set_ylabel('Number of Queries', fontsize=12)
+    ax.set_ylim(0, max(counts) + 20)
+    return fig
+
+
+# === Cross-tool figures: the initial queries and every tool side by side ===
+def grouped_bars(ax, categories, series):
+    """Bars of every source next to each other for each category; series is {source: values}."""
+    width = 0.8 / len(series)
+    x = np.arange(len(categories))
+    for i, (source, values) in enumerate(series.items()):
+        ax.bar(x + (i - (len(series) - 1) / 2) * width, values, width, label=source,
+               color=SOURCE_COLORS[i % len(SOURCE_COLORS)])
+    ax.set_xticks(x)
+    ax.set_xticklabels(categories, fontsize=11)
+    ax.legend(fontsize=10)
+
+
+def plot_cross_tool_by_task(aggregates):
+    # Share of successful queries per task and source
+    tasks = sorted({task for agg in aggregates.values() for task, _, _ in agg['by_task']})
+    rates = np.full((len(aggregates), len(tasks)), np.nan)
+    for i, agg in enumerate(aggregates.values()):
+        for task, success, error in agg['by_task']:
+            rates[i, tasks.index(task)] = success / (success + error)
+
+    fig, ax = plt.subplots(figsize=(18, 1.2 * len(aggregates) + 3))
+    image = ax.imshow(rates, aspect='auto', cmap='viridis', vmin=0, vmax=1)
+    fig.colorbar(image, ax=ax, label='Share of successful queries')
+    ax.set_title('Share of Successful Queries by LeetCode Task', fontsize=16, pad=15)
+    ax.set_xlabel('LeetCode Task No', fontsize=12)
+    ax.set_xticks(range(len(tasks)))
+    ax.set_xticklabels([str(task) for task in tasks], rotation=90, fontsize=10)
+    ax.set_yticks(range(len(aggregates)))
+    ax.set_yticklabels(list(aggregates), fontsize=11)
+    return fig
+
+
+def plot_cross_tool_by_difficulty(aggregates):
+    series = {}
+    for source, agg in aggregates.items():
+        series[source] = [100 * success / (success + error) if success + error else 0
+                          for _, success, error in agg['by_difficulty']]
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    grouped_bars(ax, DIFFICULTY_LEVELS, series)
+    ax.set_title('Successful Queries by Task Difficulty', fontsize=16, pad=15)
+    ax.set_xlabel('Task Difficulty Level', fontsize=12)
+    ax.set_ylabel('Successful Queries (%)', fontsize=12)
+    ax.set_ylim(0, 110)
+    return fig
+
+
+def plot_cross_tool_by_timerange(aggregates):
+    series = {source: [count for _, count in agg['by_timerange']] for source, agg in aggregates.items()}
+
+    fig, ax = plt.subplots(figsize=(14, 6))
+    grouped_bars(ax, TIME_LABELS, series)
+    ax.set_title('Number of Queries by Execution Time Ranges', fontsize=16, pad=15)
+    ax.set_xlabel('Execution Time Range (ms)', fontsize=12)
+    ax.set_ylabel('Number of Queries', fontsize=12)
+    return fig
+
+
+# Figure name -> (renderer, output directory, needs tool results)
+FIGURES = {
+    'queries_by_task': (plot_by_task, INITIAL_PLOTS_DIR, False),
+    'queries_by_difficulty': (plot_by_difficulty, INITIAL_PLOTS_DIR, False),
+    'queries_by_timerange': (plot_by_timerange, INITIAL_PLOTS_DIR, False),
+    'cross_tool_by_task': (plot_cross_tool_by_task, PLOTS_DIR, True),
+    'cross_tool_by_difficulty': (plot_cross_tool_by_difficulty, PLOTS_DIR, True),
+    'cross_tool_by_timerange': (plot_cross_tool_by_timerange, PLOTS_DIR, True),
+}
+
+
+def inputs_digest(name, aggregates):
+    payload = json.dumps({'figure': name, 'aggregates': aggregates}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def render_figures(root='.', tools=TOOLS, figures=None, force=False):
+    """Render the figures (all by default) in one process; unchanged figures are skipped."""
+    start = time.perf_counter()
+    figures = figures or list(FIGURES)
+    sources = [INITIAL] + (list(tools) if any(FIGURES[name][2] for name in figures) else [])
+
+    os.makedirs(os.path.join(root, PLOTS_DIR), exist_ok=True)
+    cache = ResultStore(os.path.join(root, PLOTS_DIR, CACHE_FILE), ('kind', 'name'))
+    records = cache.records()
+    aggregates = load_aggregates(root, sources, cache, records, force)
+    if INITIAL not in aggregates:
+        raise FileNotFoundError(f'Initial results not found: {result_file(root, INITIAL)}')
+
+    rendered = skipped = 0
+    for name in figures:
+        renderer, directory, cross_tool = FIGURES[name]
+        if cross_tool and len(aggregates) < 2:
+            print(f'[{name}] No tool results found, skipped')
+            continue
+        inputs = aggregates if cross_tool else {INITIAL: aggregates[INITIAL]}
+        path = os.path.join(root, directory, f'{name}.png')
+        key = ('figure', name)
+        digest = inputs_digest(name, inputs)
+        record = records.get(key)
+        if not force and os.path.exists(path) and record and record.get('fingerprint') == digest:
+            skipped += 1
+            continue
+
+        fig = renderer(inputs)
+        fig.tight_layout()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fig.savefig(path, dpi=300)
+        plt.close(fig)
+        cache.append(key, {'path': os.path.relpath(path, root)}, fingerprint=digest)
+        rendered += 1
+        print(f'Figure saved: {path}')
+
+    print(f'Rendered {rendered} figures, {skipped} unchanged, in {time.perf_counter() - start:.2f} s')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Render the query outcome and execution time figures.')
+    parser.add_argument('--root', type=str, default='.', help='Repository directory with one subdirectory per tool')
+    parser.add_argument('--tools', nargs='+', default=list(TOOLS), help='Tools shown in the cross-tool figures')
+    parser.add_argument('--figures', nargs='+', choices=list(FIGURES), default=None, help='Figures to render (default: all)')
+    parser.add_argument('--force', action='store_true', help='Recompute the aggregates and render every figure')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    render_figures(args.root, args.tools, args.figures, args.force)
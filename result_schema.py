@@ -0,0 +1,111 @@
+"""
+Typed schema of query measurement results.
+
+Numeric metrics (per-run time/cost/rows/planning time, aggregates, CI bounds, counters)
+are numeric columns; a failed run or a query without successful runs has NaN there.
+The outcome of a query is held in one categorical `status` column:
+
+    ok            all measured runs succeeded
+    partial       some runs failed (e.g. a runtime error), the others give a valid median
+    error         no run succeeded, so there is no median
+    timeout       the query was cancelled after its statement timeout
+    syntax_error  the query is invalid (SQLSTATE class 42: syntax error, undefined table/column, ...)
+
+Older CSVs wrote the strings "error" / "timeout" into the numeric columns. Migrate them with
+
+    python result_schema.py results.csv [...]
+"""
+
+import re
+import sys
+
+import pandas as pd
+
+STATUSES = ["ok", "partial", "error", "timeout", "syntax_error"]
+
+# Numeric result columns, also with the _initial / _optimazed suffixes of merged tables
+NUMERIC_COLUMN = re.compile(
+    r"^(?:(?:time_pg|cost|rows|plan_time)_\d+"
+    r"|(?:avg|median|p75|p90)_(?:pg_time|cost|rows)"
+    r"|median_ci_(?:low|high|rel_width|confidence)"
+    r"|n_runs|timeout_ms|n_workers|concurrency)"
+    r"(?:_initial|_optimazed)?$"
+)
+
+# Aggregates over the runs; older runs wrote "error" into them only when no run succeeded
+AGGREGATE_COLUMN = re.compile(r"^(?:avg|median|p75|p90)_(?:pg_time|cost|rows)")
+
+STATUS_COLUMN = re.compile(r"^status(?:_initial|_optimazed)?$")
+
+# Column suffixes of plain result tables and of merged initial/optimized tables
+SUFFIXES = ("", "_initial", "_optimazed")
+
+
+def numeric_columns(columns):
+    return [col for col in columns if NUMERIC_COLUMN.match(col)]
+
+
+def legacy_status(df, columns):
+    """Derive the status of each row from failure markers in its numeric columns:
+    "error" in the aggregates means no run succeeded, in per-run columns only that some failed."""
+    text = df[columns].astype(str).apply(lambda col: col.str.strip().str.lower())
+    aggregates = [col for col in columns if AGGREGATE_COLUMN.match(col)]
+    status = pd.Series("ok", index=df.index)
+    status[(text == "error").any(axis=1)] = "partial" if aggregates else "error"
+    if aggregates:
+        status[(text[aggregates] == "error").any(axis=1)] = "error"
+    status[(text == "timeout").any(axis=1)] = "timeout"
+    return status
+
+
+def typed(df):
+    """Numeric result columns as numbers (failure markers become NaN) and status columns as categoricals."""
+    df = df.copy()
+    for col in numeric_columns(df.columns):
+        # Integer columns without failures stay integers, so rewritten CSVs keep their values
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+    for col in df.columns:
+        if STATUS_COLUMN.match(col) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = pd.Categorical(df[col], categories=STATUSES)
+    return df
+
+
+def migrate(df):
+    """Convert a legacy result table: add or complete the status column(s), then type the columns."""
+    numeric = numeric_columns(df.columns)
+    for suffix in SUFFIXES:
+        columns = [col for col in numeric if col.endswith(suffix)
+                   and (suffix or not col.endswith(SUFFIXES[1:]))]
+        if not columns:
+            continue
+        status_column = "status" + suffix
+        derived = legacy_status(df, columns)
+        if status_column in df.columns:
+            # Keep recorded statuses; fill rows measured before the column existed
+            recorded = df[status_column].where(df[status_column].isin(STATUSES)).astype(object)
+            # Runs before "partial" existed recorded "error" also when other runs gave a median
+            if "avg_pg_time" + suffix in df.columns:
+                measured = pd.to_numeric(df["avg_pg_time" + suffix], errors="coerce").notna()
+                recorded = recorded.mask((recorded == "error") & measured, "partial")
+            df = df.assign(**{status_column: recorded.fillna(derived)})
+        else:
+            df = df.assign(**{status_column: derived})
+    return typed(df)
+
+
+def migrate_file(path, output=None):
+    # round_trip parsing keeps the stored numbers unchanged
+    df = migrate(pd.read_csv(path, float_precision="round_trip"))
+    df.to_csv(output or path, index=False)
+    return df
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        df = migrate_file(path)
+        counts = {col: df[col].value_counts().to_dict() for col in df.columns if STATUS_COLUMN.match(col)}
+        print(f"{path}: {len(df)} rows migrated, {counts}")
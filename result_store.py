@@ -0,0 +1,144 @@
+"""
+Append-only store for per-query experiment results.
+
+Every finished query is appended as a single JSON line (flushed and fsynced),
+so checkpointing costs O(1) per query instead of rewriting the whole CSV.
+A line left half-written by a crash is dropped when the store is reopened,
+and a restarted run skips every key that is already stored.
+The legacy wide CSV is materialized on demand with `materialize()`.
+
+Usage:
+    python result_store.py <results.jsonl> <source.csv> [output.csv]
+"""
+
+import csv
+import json
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+KEY_COLUMNS = ("TaskNo", "ResponseId")
+
+
+def _plain(value):
+    """Convert numpy scalars to plain Python values so they can be JSON-encoded and compared."""
+    return value.item() if hasattr(value, "item") else value
+
+
+def repair_jsonl(path):
+    """Truncate a trailing partial line left by an interrupted write."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def append_jsonl(path, record):
+    """Durably append one JSON record as a line (flushed and fsynced)."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def append_csv_rows(path, fieldnames, rows):
+    """Append rows (dicts) to a CSV table, writing the header first if the file is new; other keys are ignored."""
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def atomic_write(path, write):
+    """Write a file through write(f) on a temporary binary file in the same directory, then rename it into place."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class ResultStore:
+    """JSONL file of {"key": [...], "values": {column: value}} records; the last record per key wins."""
+
+    def __init__(self, path, key_columns=KEY_COLUMNS):
+        self.path = path
+        self.key_columns = tuple(key_columns)
+        self._repair()
+
+    def _repair(self):
+        repair_jsonl(self.path)
+
+    def row_key(self, row):
+        """Build the store key of a DataFrame row (or dict)."""
+        return tuple(_plain(row[col]) for col in self.key_columns)
+
+    def append(self, key, values, **meta):
+        """Durably append the result columns of one row (plus optional record-level metadata)."""
+        record = {"key": [_plain(k) for k in key], "values": {col: _plain(v) for col, v in values.items()}, **meta}
+        append_jsonl(self.path, record)
+
+    def records(self):
+        """Return {key: record} with the latest full record stored for every key."""
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[tuple(record["key"])] = record
+        return records
+
+    def load(self):
+        """Return {key: values} for every stored row."""
+        return {key: record["values"] for key, record in self.records().items()}
+
+    def completed_keys(self):
+        return set(self.load())
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def materialize(self, source_csv, output_csv=None, columns=None):
+        """Overlay stored results on the source CSV and write the legacy wide layout."""
+        df = pd.read_csv(source_csv)
+        records = self.load()
+        keys = [self.row_key(row) for _, row in df[list(self.key_columns)].iterrows()]
+
+        result_columns = list(columns or [])
+        for values in records.values():
+            result_columns.extend(col for col in values if col not in result_columns)
+
+        for col in result_columns:
+            existing = df[col].tolist() if col in df.columns else [None] * len(df)
+            df[col] = [
+                records[key][col] if key in records and col in records[key] else old
+                for key, old in zip(keys, existing)
+            ]
+
+        df.to_csv(output_csv or source_csv, index=False)
+        return df
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print(__doc__)
+        sys.exit(1)
+    store_path, source = sys.argv[1], sys.argv[2]
+    output = sys.argv[3] if len(sys.argv) == 4 else None
+    ResultStore(store_path).materialize(source, output)
+    print(f"Results from {store_path} written to {output or source}")
@@ -0,0 +1,503 @@
+"""
+Shared driver for query rewriters (ChatGPT, DeepSeek, R-Bot, LearnedRewrite).
+
+A rewriter is a small plugin class:
+- name: tool name used in the checkpoint and in logs
+- setup(): per-process initialisation (DB connections, docstores, JVMs); called once per worker
+- rewrite(row): rewrite one input row and return a dict with at least 'Query'
+- rewrite_batch(rows, on_result): optional; LLM plugins send the whole batch concurrently
+- record(row, result): optional; called in the parent process with every result, so files
+  written there (e.g. a tool's own result log) have a single writer whatever the worker count
+
+run_rewriter() reads the input CSV, skips rows already finished in the checkpoint,
+runs the plugin sequentially, in worker processes, or as one batch, and writes every
+tool's results in the same schema (OUTPUT_COLUMNS plus the plugin's extra_columns).
+Checkpoint entries are keyed by (TaskNo, ResponseId), or by the first of
+FALLBACK_KEY_COLUMNS an input without them has (else the row number).
+With a per-query timeout the rows go to supervised workers instead (WorkerPool): a
+worker that exceeds the timeout or dies is killed and replaced, only its row fails.
+A failed rewrite is written with Query = 'error' and its message in Error; it is
+retried on the next run.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import time
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+from catalog import CACHE_FILE as CATALOG_CACHE_FILE
+from checkpoint import Checkpoint
+from result_store import KEY_COLUMNS
+from llm_cache import ResponseCache
+from llm_client import AsyncRewriteClient, extract_query
+from plan_parser import compact_text_plan
+from prompt_budget import PLAN_TOP_NODES, PROMPT_TOKEN_BUDGET, append_prompt_stats, count_tokens, token_counter
+
+OUTPUT_COLUMNS = ['Id', 'TaskNo', 'ResponseId', 'Difficulty', 'Query', 'RewriteTime_ms', 'Error']
+
+# Checkpoint key of inputs without TaskNo/ResponseId (e.g. leetcode_uniform.csv); ROW_KEY is the row number
+FALLBACK_KEY_COLUMNS = ['Id', 'Name']
+ROW_KEY = 'Row'
+
+# Static database environment information sent to LLM rewriters
+# (schema, index, size and distribution details come from the Catalog when one is given)
+SYSTEM = 'PostgreSQL'
+VERSION = '14.17'
+HOSTING_ENVIRONMENT = 'Intel(R) Core(TM) i5-6200U @ 2.3GHz, 8GB RAM, 200GB SSD, Ubuntu 22.04'
+DATA_DISTRIBUTION = 'Uniform distribution, no significant skew'
+
+
+class Rewriter:
+    """Base class of rewriter plugins. Instances are pickled to worker processes before setup()."""
+
+    name = 'rewriter'
+    extra_columns = []
+    batched = False  # True if rewrite_batch() handles concurrency itself
+
+    def setup(self):
+        pass
+
+    def rewrite(self, row):
+        raise NotImplementedError
+
+    def rewrite_batch(self, rows, on_result):
+        for i, row in enumerate(rows):
+            on_result(i, timed_rewrite(self, row))
+
+    def record(self, row, result):
+        pass
+
+
+def timed_rewrite(rewriter, row):
+    """Run rewriter.rewrite(row), measuring wall time and turning exceptions into an error result."""
+    start = time.perf_counter()
+    try:
+        result = rewriter.rewrite(row)
+    except Exception as e:
+        print(f"[ERROR] {rewriter.name} failed on Id={row.get('Id', 'N/A')}: {e}")
+        result = {'Query': 'error', 'Error': str(e), 'RewriteTime_ms': -1}
+    result.setdefault('RewriteTime_ms', round((time.perf_counter() - start) * 1000, 2))
+    return result
+
+
+# === Worker processes: each holds its own set-up rewriter ===
+_worker_rewriter = None
+
+
+def _init_worker(rewriter):
+    global _worker_rewriter
+    _worker_rewriter = rewriter
+    _worker_rewriter.setup()
+
+
+def _rewrite_task(task):
+    i, row = task
+    return i, timed_rewrite(_worker_rewriter, row)
+
+
+# === Supervised workers: per-query timeout, hung or crashed workers are replaced ===
+
+# Seconds between checks of worker deadlines and liveness
+POLL_INTERVAL = 0.5
+
+
+def _supervised_worker(rewriter, tasks, results):
+    rewriter.setup()
+    results.put(('ready', os.getpid(), None, None))
+    for i, row in iter(tasks.get, None):
+        results.put(('result', os.getpid(), i, timed_rewrite(rewriter, row)))
+
+
+class _Worker:
+    """One long-lived worker process with its own task queue; it is sent one row at a time."""
+
+    def __init__(self, ctx, rewriter, results):
+        self.tasks = ctx.Queue()
+        self.process = ctx.Process(target=_supervised_worker, args=(rewriter, self.tasks, results), daemon=True)
+        self.process.start()
+        self.ready = False
+        self.started = time.monotonic()  # setup() must finish within the pool's timeout from here
+        self.task = None  # (i, start) of the row being rewritten
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            self.tasks.put(None)
+        self.process.join(POLL_INTERVAL * 10)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.tasks.cancel_join_thread()
+
+
+class WorkerPool:
+    """Worker processes that call setup() once and then rewrite rows until the pool is closed.
+
+    Rows are dispatched only to workers whose setup() finished; setup() (a JVM, a docstore) gets
+    its own `timeout` seconds, and a worker that dies or hangs in it raises RuntimeError. A row
+    running longer than `timeout` seconds gets a timeout result (status 'timeout', not retried on
+    rerun) and a row whose worker dies an error result; the worker is killed and a new one is started.
+    """
+
+    def __init__(self, rewriter, workers, timeout=None):
+        self.rewriter = rewriter
+        self.size = max(1, workers)
+        self.timeout = timeout
+        self.ctx = mp.get_context()
+        self.results = self.ctx.Queue()
+        self.workers = {}
+        self.restarts = 0
+
+    def spawn(self):
+        worker = _Worker(self.ctx, self.rewriter, self.results)
+        self.workers[worker.process.pid] = worker
+
+    def replace(self, pid, error, on_result, status='error'):
+        worker = self.workers.pop(pid)
+        worker.stop(kill=True)
+        if not worker.ready:
+            raise RuntimeError(f"[{self.rewriter.name}] worker {pid} failed in setup(): {error}")
+        if worker.task is not None:
+            i, start = worker.task
+            print(f"[ERROR] {self.rewriter.name} worker {pid}: {error}; restarting it")
+            on_result(i, {'Query': 'error', 'Error': error, 'Status': status,
+                          'RewriteTime_ms': round((time.monotonic() - start) * 1000, 2)})
+        self.restarts += 1
+        self.spawn()
+
+    def receive(self, on_result):
+        """Handle the messages of the workers, waiting up to POLL_INTERVAL for the first; returns the number of results."""
+        received = 0
+        wait = POLL_INTERVAL
+        while True:
+            try:
+                kind, pid, i, result = self.results.get(timeout=wait) if wait else self.results.get_nowait()
+            except queue.Empty:
+                return received
+            wait = 0
+            worker = self.workers.get(pid)
+            if worker is None:
+                continue  # Late message of a worker that was already replaced
+            if kind == 'ready':
+                worker.ready = True
+            elif worker.task is not None and worker.task[0] == i:
+                worker.task = None
+                on_result(i, result)
+                received += 1
+
+    def run(self, rows, on_result):
+        todo = deque(range(len(rows)))
+        remaining = len(rows)
+        for _ in range(min(self.size, remaining)):
+            self.spawn()
+        try:
+            while remaining:
+                for worker in self.workers.values():
+                    if worker.ready and worker.task is None and todo:
+                        i = todo.popleft()
+                        worker.task = (i, time.monotonic())
+                        worker.tasks.put((i, rows[i]))
+
+                remaining -= self.receive(on_result)
+
+                now = time.monotonic()
+                for pid, worker in list(self.workers.items()):
+                    status = 'error'
+                    if not worker.process.is_alive():
+                        error = f"Worker process died (exit code {worker.process.exitcode})"
+                    elif self.timeout and not worker.ready and now - worker.started > self.timeout:
+                        error = f"setup() did not finish within {self.timeout} s"
+                    elif self.timeout and worker.task is not None and now - worker.task[1] > self.timeout:
+                        error, status = f"Timed out after {self.timeout} s", 'timeout'
+                    else:
+                        continue
+                    if worker.task is not None:
+                        remaining -= 1
+                    self.replace(pid, error, on_result, status)
+        finally:
+            for worker in self.workers.values():
+                worker.stop(kill=worker.task is not None)
+            self.workers.clear()
+        if self.restarts:
+            print(f"[{self.rewriter.name}] {self.restarts} worker(s) restarted after timeouts or crashes")
+
+
+def output_row(rewriter, row, result):
+    """Build the common output record of one rewritten row."""
+    out = {
+        'Id': row.get('Id'),
+        'TaskNo': row.get('TaskNo'),
+        'ResponseId': row.get('ResponseId'),
+        'Difficulty': row.get('Difficulty', 'N/A'),
+        'Query': result.get('Query') or 'error',
+        'RewriteTime_ms': result.get('RewriteTime_ms', -1),
+        'Error': result.get('Error', ''),
+    }
+    for col in rewriter.extra_columns:
+        out[col] = result.get(col, '')
+    return out
+
+
+def checkpoint_key_columns(columns):
+    """KEY_COLUMNS if the input has them all, else the first fallback column it has (or ROW_KEY)."""
+    if all(col in columns for col in KEY_COLUMNS):
+        return list(KEY_COLUMNS)
+    return [next((col for col in FALLBACK_KEY_COLUMNS if col in columns), ROW_KEY)]
+
+
+def run_rewriter(rewriter, input_csv, output_csv, checkpoint_file, workers=1, timeout=None):
+    """Rewrite every query of input_csv with the plugin and write the results to output_csv.
+    With a timeout (seconds per query) the rows are rewritten by a WorkerPool of `workers` processes."""
+    df = pd.read_csv(input_csv)
+    key_columns = checkpoint_key_columns(df.columns)
+    if key_columns == [ROW_KEY]:
+        df[ROW_KEY] = df.index
+    checkpoint = Checkpoint(checkpoint_file, rewriter.name, key_columns)
+
+    results = {}
+    pending = []
+    for index, row in df.iterrows():
+        if checkpoint.is_done(row, row['Query']):
+            results[index] = checkpoint.values(row)
+        else:
+            pending.append((index, row))
+    rows = [row for _, row in pending]
+    print(f"[{rewriter.name}] Rewriting {len(rows)} of {len(df)} queries ({len(df) - len(rows)} reused from checkpoint)")
+
+    def on_result(i, result):
+        index, row = pending[i]
+        out = output_row(rewriter, row, result)
+        rewriter.record(row, result)
+        # Timed-out rows count as done, so a rerun does not wait for them again
+        status = result.get('Status') or ('error' if out['Query'] == 'error' else 'ok')
+        checkpoint.record(row, out, status, row['Query'])
+        results[index] = out
+        print(f"Processed row {index + 1}/{len(df)}: Id={out['Id']}, TaskNo={out['TaskNo']}, ResponseId={out['ResponseId']}")
+
+    start = time.perf_counter()
+    if timeout and not rewriter.batched and rows:
+        WorkerPool(rewriter, workers, timeout).run(rows, on_result)
+    elif workers > 1 and not rewriter.batched and rows:
+        with mp.Pool(processes=workers, initializer=_init_worker, initargs=(rewriter,)) as pool:
+            for i, result in pool.imap_unordered(_rewrite_task, list(enumerate(rows))):
+                on_result(i, result)
+    elif rows:
+        rewriter.setup()
+        rewriter.rewrite_batch(rows, on_result)
+    elapsed = time.perf_counter() - start
+
+    # Results are written in input order
+    columns = OUTPUT_COLUMNS + rewriter.extra_columns
+    output_df = pd.DataFrame([results[index] for index in df.index if index in results], columns=columns)
+    output_df.to_csv(output_csv, index=False)
+
+    failed = int((output_df['Query'] == 'error').sum())
+    print(f"[{rewriter.name}] {len(rows)} rewrites in {elapsed:.1f} s; {failed} failed rows in output")
+    print(f"Optimized queries saved to: {output_csv}")
+    return output_df
+
+
+def rewriter_arg_parser(description, input_csv, output_csv='optimized_queries.csv',
+                        checkpoint_file='optimized_queries.checkpoint.jsonl', workers=True):
+    """Command-line options shared by all rewriter scripts (--workers only for plugins run in worker processes)."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--input', type=str, default=input_csv, help='CSV file with initial queries')
+    parser.add_argument('--output', type=str, default=output_csv, help='CSV file for optimized queries')
+    parser.add_argument('--checkpoint', type=str, default=checkpoint_file, help='Checkpoint manifest of finished rows')
+    if workers:
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+    return parser
+
+
+# === LLM rewriters ===
+
+def log_interaction(log_file, query_id, prompt, response_text, label, prompt_tokens=None):
+    """Log prompt and response interactions to a file."""
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    tokens = f" | Prompt tokens: {prompt_tokens}" if prompt_tokens is not None else ""
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(f"\n=== {timestamp} | Query ID: {query_id}{tokens} ===\n")
+        f.write(">>> Prompt Sent:\n")
+        f.write(prompt + "\n")
+        f.write(f">>> {label} Response:\n")
+        f.write(response_text + "\n")
+        f.write("=" * 50 + "\n")
+
+
+def build_prompt(original_query, db_info):
+    """Build the query optimization prompt sent to the model."""
+    return f"""
+Please rewrite the following SQL query to improve execution time.
+Provide only the optimized SQL query as output, without explanations, comments, or schema modifications.
+
+Initial Query:
+{original_query}
+
+Database Management System:
+{db_info['dbms']} (Version: {db_info['version']})
+
+Hosting Environment:
+{db_info['hosting_environment']}
+
+Tables Info:
+{db_info['table_info']}
+
+Constraints Info:
+{db_info['constraint_info']}
+
+Indexes Info:
+{db_info['index_info']}
+
+Tables Size:
+{db_info['table_size']}
+
+Data Distribution:
+{db_info['data_distribution']}
+
+Initial Execution Plan:
+{db_info['execution_plan']}
+"""
+
+
+class LLMRewriter(Rewriter):
+    """Rewriter for OpenAI-compatible chat models; the batch is sent through AsyncRewriteClient.
+
+    Prompts are kept within token_budget: the schema context covers only the tables the
+    query references (with a catalog) and the plan is compacted step by step (PLAN_TOP_NODES);
+    token counts and latency of every request go to <log_file>_prompts.csv.
+    """
+
+    model = None
+    api_url = None
+    log_file = 'llm_interactions.log'
+    batched = True
+
+    def __init__(self, api_key, plans=None, api_url=None, concurrency=8, rate=5.0, cache_dir=None,
+                 cache_max_bytes=256 * 1024 * 1024, max_tokens=500, temperature=0.1, catalog=None,
+                 token_budget=PROMPT_TOKEN_BUDGET):
+        self.api_key = api_key
+        self.plans = plans
+        self.catalog = catalog
+        self.api_url = api_url or self.api_url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.token_budget = token_budget
+
+    @property
+    def stats_file(self):
+        return os.path.splitext(self.log_file)[0] + '_prompts.csv'
+
+    def schema_info(self, row):
+        """Schema context of a row: introspected by the catalog, else the precomputed CSV columns."""
+        if self.catalog is not None:
+            try:
+                return self.catalog.context(row['TaskNo'], row['Query'])
+            except Exception as e:
+                print(f"[Catalog] No context for task {row.get('TaskNo')}, using CSV columns: {e}")
+        return {
+            'table_info': row.get('table_info', 'N/A'),
+            'constraint_info': row.get('constraint_info', 'N/A'),
+            'index_info': row.get('index_info', 'N/A'),
+            'table_size': row.get('table_size', 'N/A'),
+            'data_distribution': DATA_DISTRIBUTION,
+        }
+
+    def plan_info(self, row, top_nodes=None):
+        plan = row.get('plan_hash_5', row.get('explain_run_5'))
+        if self.plans is not None:
+            return self.plans.text(plan, top_nodes=top_nodes)
+        return compact_text_plan(plan) if top_nodes and isinstance(plan, str) else plan
+
+    def db_info(self, row, top_nodes=None):
+        return {
+            'dbms': SYSTEM,
+            'version': VERSION,
+            'hosting_environment': HOSTING_ENVIRONMENT,
+            **self.schema_info(row),
+            'execution_plan': self.plan_info(row, top_nodes)
+        }
+
+    def prepare_prompt(self, row):
+        """Prompt of a row within the token budget, and its size statistics."""
+        info = self.db_info(row, PLAN_TOP_NODES[0])
+        for top_nodes in PLAN_TOP_NODES:
+            if top_nodes != PLAN_TOP_NODES[0]:
+                info['execution_plan'] = self.plan_info(row, top_nodes)
+            prompt = build_prompt(row['Query'], info)
+            prompt_tokens = count_tokens(prompt, self.model)
+            if prompt_tokens <= self.token_budget:
+                break
+        return prompt, {
+            'Id': row.get('Id'),
+            'TaskNo': row.get('TaskNo'),
+            'ResponseId': row.get('ResponseId'),
+            'prompt_tokens': prompt_tokens,
+            'plan_tokens': count_tokens(info['execution_plan'], self.model),
+            'schema_tables': 0 if info['table_info'] == 'N/A' else len(str(info['table_info']).splitlines()),
+            'plan_top_nodes': top_nodes,
+            'within_budget': prompt_tokens <= self.token_budget,
+            'token_counter': token_counter(),
+        }
+
+    def rewrite(self, row):
+        results = []
+        self.rewrite_batch([row], lambda i, result: results.append(result))
+        return results[0]
+
+    def rewrite_batch(self, rows, on_result):
+        prompts, stats = zip(*(self.prepare_prompt(row) for row in rows)) if rows else ((), ())
+        over_budget = sum(not s['within_budget'] for s in stats)
+        print(f"[Prompts] {len(prompts)} prompts, {sum(s['prompt_tokens'] for s in stats)} tokens "
+              f"({token_counter()}), {over_budget} over the budget of {self.token_budget}")
+        cache = ResponseCache(self.cache_dir, self.cache_max_bytes) if self.cache_dir else None
+        client = AsyncRewriteClient(self.api_url, self.api_key, self.model, max_tokens=self.max_tokens,
+                                    temperature=self.temperature, concurrency=self.concurrency,
+                                    rate=self.rate, cache=cache)
+
+        def handle(i, result):
+            log_interaction(self.log_file, rows[i].get('Id'), prompts[i], result['response_text'], self.name,
+                            stats[i]['prompt_tokens'])
+            finish_reason = result['finish_reason']
+            append_prompt_stats(self.stats_file, {
+                **stats[i],
+                # As reported by the API (empty if it did not report them, e.g. for older cache entries)
+                'completion_tokens': result['completion_tokens'],
+                'truncated': '' if finish_reason is None else finish_reason == 'length',
+                'finish_reason': finish_reason,
+                'duration_ms': result['duration_ms'],
+                'cached': result['cached'],
+                'error': result['error'] or '',
+            })
+            if result['error'] is None:
+                on_result(i, {'Query': extract_query(result['response_text']), 'RewriteTime_ms': result['duration_ms']})
+            else:
+                on_result(i, {'Query': 'error', 'RewriteTime_ms': -1, 'Error': result['error']})
+
+        client.run(prompts, handle)
+        client.report()
+        if self.catalog is not None:
+            print(f"[Catalog] {len(self.catalog.documents)} schemas, {self.catalog.queries} catalog queries")
+
+
+def llm_arg_parser(description, input_csv, api_url, concurrency=8, rate=5.0, cache_dir='llm_cache'):
+    """Command-line options of LLM rewriter scripts (batched: parallelism is set with --concurrency, not --workers)."""
+    parser = rewriter_arg_parser(description, input_csv, workers=False)
+    parser.add_argument('--api-url', type=str, default=api_url, help='Chat completions endpoint (e.g. a local mock server)')
+    parser.add_argument('--concurrency', type=int, default=concurrency, help='Maximum number of requests in flight')
+    parser.add_argument('--rate', type=float, default=rate, help='Maximum requests per second (0 = unlimited)')
+    parser.add_argument('--cache-dir', type=str, default=cache_dir, help='Directory of the response cache')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the API, bypassing the response cache')
+    parser.add_argument('--catalog', type=str, default=CATALOG_CACHE_FILE, help='Cache of introspected schema_<TaskNo> catalogs')
+    parser.add_argument('--no-catalog', action='store_true', help='Take the schema context from CSV columns instead of pg_catalog')
+    parser.add_argument('--token-budget', type=int, default=PROMPT_TOKEN_BUDGET, help='Prompt size the plan is compacted to (tokens)')
+    return parser
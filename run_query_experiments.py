@@ -1,147 +1,455 @@
+import argparse
+import multiprocessing as mp
+import os
 import psycopg2
+from psycopg2 import errors, pool
 import pandas as pd
 import statistics
+import subprocess
+import time
+import zlib
 
-# === Database connection parameters ===
-DB_CONFIG = {
-    "dbname": "leetcode_uniform",
-    "user": "postgres",
-    "password": "", 
-    "host": "localhost",
-    "port": "5432",
-}
+from checkpoint import Checkpoint
+from columnar import refresh_parquet
+from db_config import DB_CONFIG
+from sampling import AdaptiveSampler
+from plan_parser import (
+    PLAN_NODES_SUFFIX, PLAN_STORE_SUFFIX, PlanStore, append_node_metrics, load_explain, node_metrics, plan_hash, plan_summary
+)
 
-N_RUNS = 5  # Number of executions per query
+N_RUNS = 5  # Minimum number of executions per query (needed by the Shapiro/Mann-Whitney tests)
+MAX_RUNS = 30  # Upper bound for adaptive repetition (MAX_RUNS = N_RUNS gives a fixed run count)
+TARGET_CI_WIDTH = 0.05  # Stop once the median's confidence interval is within 5% of the median
+CI_CONFIDENCE = 0.95  # Confidence level of the median interval
+TIME_BUDGET_MS = 60000  # Wall-clock budget for the measured runs of one query
+
+# === Runaway-query guard ===
+BASELINE_FILE = None  # Measured initial queries (median_pg_time), used to scale the timeout of their rewrites
+TIMEOUT_FACTOR = 10  # Timeout = TIMEOUT_FACTOR x median time of the initial query
+MIN_TIMEOUT_MS = 1000  # Lower bound so that very fast initial queries do not get a hair-trigger timeout
+DEFAULT_TIMEOUT_MS = 300000  # Timeout when no baseline median is known (e.g. when measuring the initial queries)
 QUERY_FILE = "/home/kseniia/Documents/data/Initial_queries_raw_results.csv"  # Input CSV file with queries
+RESULTS_STORE_SUFFIX = ".results.jsonl"  # Append-only per-query results (checkpoint manifest), stored next to QUERY_FILE
+
+# === Parallel execution settings ===
+N_WORKERS = 1  # Number of worker processes (1 = sequential run over a single connection)
+ISOLATION_MODES = ("none", "schema", "full")
+ISOLATION = "schema"  # none: fully concurrent, schema: serialize queries on the same schema_<TaskNo>, full: one measurement at a time
+SCHEMA_LOCK_STRIPES = 64  # Number of locks that schemas are hashed onto in "schema" isolation
+
+# === Cache reset settings ===
+RESET_STRATEGIES = ("none", "session", "stats", "discard", "os_cache")
+RESET_STRATEGY = "stats"  # none | session (RESET ALL) | stats (pg_stat_reset) | discard (DISCARD ALL) | os_cache (drop OS page cache + stats)
+SERVER_WIDE_RESETS = ("os_cache",)  # Evict what other workers have cached, so they need "full" isolation with several workers
+DROP_CACHES_CMD = ["sudo", "-n", "/usr/local/bin/drop_caches"]  # Local helper that runs `sync; echo 3 > /proc/sys/vm/drop_caches`
+
+_control_pool = None
 
-# === Resets PostgreSQL configuration and statistics to reduce caching effects before each run.
-def reset_cache():
+# === Returns the pool holding the control connection used for server-wide resets (created lazily per process).
+def get_control_pool():
+    global _control_pool
+    if _control_pool is None:
+        _control_pool = pool.SimpleConnectionPool(1, 1, **DB_CONFIG)
+    return _control_pool
+
+# === Resets PostgreSQL state before each run to reduce caching effects, using the selected strategy.
+# A failed OS cache drop raises, so that warm runs are never recorded as os_cache (cold) runs.
+def reset_cache(conn=None, strategy=RESET_STRATEGY):
+    if strategy == "none":
+        return
+    if strategy == "os_cache":
+        try:
+            subprocess.run(DROP_CACHES_CMD, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise RuntimeError(f"Cannot drop the OS page cache with {' '.join(DROP_CACHES_CMD)}: {e}") from e
     try:
-        with psycopg2.connect(**DB_CONFIG) as conn:
+        if strategy in ("session", "discard"):
+            # Session-level resets must run on the measurement connection itself, outside a transaction block
+            conn.rollback()
             conn.autocommit = True
-            with conn.cursor() as cursor:
-                cursor.execute("RESET ALL;")
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("RESET ALL;" if strategy == "session" else "DISCARD ALL;")
+            finally:
+                conn.autocommit = False
+            return
+
+        control_pool = get_control_pool()
+        control = control_pool.getconn()
+        try:
+            control.autocommit = True
+            with control.cursor() as cursor:
                 cursor.execute("SELECT pg_stat_reset();")
+        finally:
+            # A broken control connection is discarded so the next reset reconnects
+            control_pool.putconn(control, close=bool(control.closed))
     except psycopg2.Error as e:
         print(f"Cache reset error: {e}")
 
-# === Executes a SQL query using EXPLAIN ANALYZE and extracts execution time, cost, rows, and full plan. ===
-def execute_query(query, conn):
+# === Executes a SQL query using EXPLAIN (FORMAT JSON) and extracts execution time, cost, rows, and the parsed plan. ===
+# The query is cancelled by the server after timeout_ms; the last value is the outcome (ok, error or timeout).
+def execute_query(query, conn, timeout_ms=DEFAULT_TIMEOUT_MS):
     try:
         with conn.cursor() as cursor:
             cursor.execute("SET max_parallel_workers_per_gather = 0;")
-            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, TIMING OFF) {query}")
-            explain_result = cursor.fetchall()
+            cursor.execute("SET statement_timeout = %s;", (int(timeout_ms),))
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, TIMING OFF, FORMAT JSON) {query}")
+            explain = load_explain(cursor.fetchone()[0])
 
-        explain_text = "\n".join([line[0] for line in explain_result])
+        summary = plan_summary(explain)
+        return summary["execution_time"], summary["total_cost"], summary["actual_rows"], explain, "ok"
 
-        exec_line = next((l[0] for l in explain_result if "Execution Time" in l[0]), None)
-        exec_time = float(exec_line.split(":")[1].strip().split(" ")[0]) if exec_line else None
-
-        cost_line = next((l[0] for l in explain_result if "cost=" in l[0]), None)
-        cost = float(cost_line.split("cost=")[1].split("..")[1].split(" ")[0]) if cost_line else None
-
-        rows_line = next((l[0] for l in explain_result if "actual rows=" in l[0]), None)
-        row_count = int(rows_line.split("actual rows=")[1].split(" ")[0]) if rows_line else None
+    except errors.QueryCanceled:
+        print(f"[execute_query TIMEOUT] Query cancelled after {int(timeout_ms)} ms")
+        conn.rollback()
+        return None, None, None, None, "timeout"
 
-        return exec_time, cost, row_count, explain_text
+    except psycopg2.Error as e:
+        # SQLSTATE class 42: syntax error or access rule violation (e.g. undefined table or column)
+        status = "syntax_error" if (e.pgcode or "").startswith("42") else "error"
+        print(f"[execute_query {status.upper()}] {e}")
+        conn.rollback()
+        return None, None, None, None, status
 
     except Exception as e:
         print(f"[execute_query ERROR] {e}")
         conn.rollback()
-        return None, None, None, None
+        return None, None, None, None, "error"
 
-# === Main function that runs each query N times, collects performance stats, and saves results to CSV. ===
-def run_experiments():
-    df = pd.read_csv(QUERY_FILE)
+# === Per-query timeout: TIMEOUT_FACTOR x the initial query's median time, bounded below by MIN_TIMEOUT_MS. ===
+def query_timeout(baseline_median_ms):
+    if baseline_median_ms is None or pd.isna(baseline_median_ms):
+        return DEFAULT_TIMEOUT_MS
+    return max(MIN_TIMEOUT_MS, TIMEOUT_FACTOR * baseline_median_ms)
+
+# === Loads measured median times of the initial queries, keyed by (TaskNo, ResponseId). ===
+def load_baseline_medians(baseline_file):
+    if not baseline_file:
+        return {}
+    baseline = pd.read_csv(baseline_file, usecols=["TaskNo", "ResponseId", "median_pg_time"])
+    medians = pd.to_numeric(baseline["median_pg_time"], errors="coerce")
+    return {
+        (task_no, response_id): median
+        for task_no, response_id, median in zip(baseline["TaskNo"], baseline["ResponseId"], medians)
+        if not pd.isna(median)
+    }
+
+# === Quantile cut point that also works for a single sample (e.g. a query that timed out after one run). ===
+def quantile(data, n, i):
+    return statistics.quantiles(data, n=n)[i] if len(data) > 1 else data[0]
+
+# === Runs the warm-up plus adaptively repeated measured executions of one query. ===
+# Returns the result columns plus plan details: distinct plans by hash and per-node metrics of every run.
+def measure_query(query, conn, label="", reset_strategy=RESET_STRATEGY, sampler=None, timeout_ms=DEFAULT_TIMEOUT_MS):
+    sampler = sampler or default_sampler()
+    values = {}
+    details = {"plans": {}, "nodes": []}
+    pg_times = []
+    costs = []
+    row_counts = []
+
+    statuses = set()
+
+    # Warm-up run to pre-load data; a query that times out or is invalid is not retried
+    print(f"\n[INFO] Warming up query before measurement...")
+    reset_cache(conn, reset_strategy)
+    *_, warmup_status = execute_query(query, conn, timeout_ms)
+
+    started = time.perf_counter()
+    run = 0
+    stop_reason = warmup_status if warmup_status in ("timeout", "syntax_error") else None
+    if stop_reason:
+        statuses.add(warmup_status)
+    while stop_reason is None:
+        run += 1
+        reset_cache(conn, reset_strategy)
+        pg_time, cost, row_count, explain, status = execute_query(query, conn, timeout_ms)
+
+        if status != "ok":
+            # A failed run has no measurements (NaN in the typed result table); its outcome goes to status
+            for col in ["time_pg", "cost", "rows", "plan_time", "plan_hash"]:
+                values[f"{col}_{run}"] = None
+            statuses.add(status)
+            if status in ("timeout", "syntax_error"):
+                stop_reason = status
+            else:
+                stop_reason = sampler.stop_reason(pg_times, run, (time.perf_counter() - started) * 1000)
+            continue
+
+        digest = plan_hash(explain)
+        details["plans"].setdefault(digest, explain)
+        details["nodes"].extend({"run": run, "plan_hash": digest, **node} for node in node_metrics(explain))
+
+        values[f"time_pg_{run}"] = pg_time
+        values[f"cost_{run}"] = cost
+        values[f"rows_{run}"] = row_count
+        values[f"plan_time_{run}"] = explain.get("Planning Time")
+        values[f"plan_hash_{run}"] = digest
+
+        pg_times.append(pg_time)
+        costs.append(cost)
+        row_counts.append(row_count)
+
+        print(f"\n{label}")
+        print(f"[RUN {run}/{sampler.max_runs}]")
+        print(f"   - Execution Time: {pg_time:.4f} ms")
+        print(f"   - Query Cost:     {cost}")
+        print(f"   - Rows Returned:  {row_count}")
+
+        stop_reason = sampler.stop_reason(pg_times, run, (time.perf_counter() - started) * 1000)
+
+    # Achieved precision of the median
+    values["n_runs"] = run
+    values["stop_reason"] = stop_reason
+    values["timeout_ms"] = timeout_ms
+    values.update(sampler.precision(pg_times))
+    if values["median_ci_rel_width"] is not None:
+        print(f"   - Stopped after {run} runs ({stop_reason}), median CI width "
+              f"{values['median_ci_rel_width']:.2%} at {values['median_ci_confidence']:.1%} confidence")
 
-    for i in range(1, N_RUNS + 1):
-        df[f"time_pg_{i}"] = None
-        df[f"cost_{i}"] = None
-        df[f"rows_{i}"] = None
-        df[f"explain_run_{i}"] = None
+    # Aggregating results; metrics without any successful run are left empty (NaN)
+    # and the outcome of the query is recorded in the status column (see result_schema.py)
+    # (a query with some failed runs is "partial" if the others give a median, else "error")
+    for status in ("syntax_error", "timeout"):
+        if status in statuses:
+            values["status"] = status
+            break
+    else:
+        if not pg_times:
+            values["status"] = "error"
+        else:
+            values["status"] = "partial" if "error" in statuses else "ok"
 
-    result_columns = [
+    if pg_times:
+        values["avg_pg_time"] = statistics.mean(pg_times)
+        values["median_pg_time"] = statistics.median(pg_times)
+        values["p75_pg_time"] = quantile(pg_times, 4, 2)
+        values["p90_pg_time"] = quantile(pg_times, 10, 8)
+    else:
+        for col in ["avg_pg_time", "median_pg_time", "p75_pg_time", "p90_pg_time"]:
+            values[col] = None
+
+    if costs:
+        values["avg_cost"] = statistics.mean(costs)
+        values["median_cost"] = statistics.median(costs)
+    else:
+        values["avg_cost"] = None
+        values["median_cost"] = None
+
+    if row_counts:
+        values["avg_rows"] = statistics.mean(row_counts)
+        values["median_rows"] = statistics.median(row_counts)
+        values["p75_rows"] = quantile(row_counts, 4, 2)
+        values["p90_rows"] = quantile(row_counts, 10, 8)
+    else:
+        for col in ["avg_rows", "median_rows", "p75_rows", "p90_rows"]:
+            values[col] = None
+
+    return values, details
+
+def default_sampler():
+    return AdaptiveSampler(N_RUNS, MAX_RUNS, TARGET_CI_WIDTH, CI_CONFIDENCE, TIME_BUDGET_MS)
+
+# === Parallel executor: every worker process holds its own pinned connection. ===
+_worker_conn = None
+_global_lock = None
+_schema_locks = None
+_active_measurements = None
+_peaks = None
+_isolation = ISOLATION
+_reset_strategy = RESET_STRATEGY
+_sampler = None
+
+def _init_worker(global_lock, schema_locks, active_measurements, peaks, isolation, reset_strategy, sampler):
+    global _worker_conn, _global_lock, _schema_locks, _active_measurements, _peaks, _isolation, _reset_strategy, _control_pool, _sampler
+    _worker_conn = psycopg2.connect(**DB_CONFIG)
+    _control_pool = None
+    _reset_strategy = reset_strategy
+    _sampler = sampler
+    _global_lock = global_lock
+    _schema_locks = schema_locks
+    _active_measurements = active_measurements
+    _peaks = peaks
+    _isolation = isolation
+
+def _measurement_lock(task_no):
+    """Return the lock that serializes measurements conflicting with this task (None = no isolation)."""
+    if _isolation == "full":
+        return _global_lock
+    if _isolation == "schema":
+        # Queries of the same task read the same schema_<TaskNo> tables and buffers
+        return _schema_locks[zlib.crc32(str(task_no).encode()) % len(_schema_locks)]
+    return None
+
+# Each measurement in flight holds a slot of _peaks with the most measurements in flight since it started
+# (0 = free slot); both are updated under the lock of _active_measurements.
+def _begin_measurement():
+    with _active_measurements.get_lock():
+        _active_measurements.value += 1
+        active = _active_measurements.value
+        slot = next(i for i, peak in enumerate(_peaks) if peak == 0)
+        for i in range(len(_peaks)):
+            if _peaks[i]:
+                _peaks[i] = max(_peaks[i], active)
+        _peaks[slot] = active
+        return slot
+
+def _end_measurement(slot):
+    with _active_measurements.get_lock():
+        peak = _peaks[slot]
+        _peaks[slot] = 0
+        _active_measurements.value -= 1
+        return peak
+
+def _measure_task(task):
+    index, task_no, label, query, timeout_ms = task
+    lock = _measurement_lock(task_no)
+    if lock is not None:
+        lock.acquire()
+    try:
+        slot = _begin_measurement()
+        try:
+            values, details = measure_query(query, _worker_conn, label, _reset_strategy, _sampler, timeout_ms)
+        finally:
+            # Peak number of measurements in flight at any time while this query was measured
+            concurrency = _end_measurement(slot)
+    finally:
+        if lock is not None:
+            lock.release()
+    values["concurrency"] = concurrency
+    return index, values, details
+
+# === Result columns of the legacy wide CSV, in output order (per-run columns for up to max_runs runs) ===
+def result_columns(max_runs=MAX_RUNS):
+    columns = []
+    for i in range(1, max_runs + 1):
+        columns += [f"time_pg_{i}", f"cost_{i}", f"rows_{i}", f"plan_time_{i}", f"plan_hash_{i}"]
+    columns += [
         "avg_pg_time", "median_pg_time", "p75_pg_time", "p90_pg_time",
         "avg_cost", "median_cost",
-        "avg_rows", "median_rows", "p75_rows", "p90_rows"
+        "avg_rows", "median_rows", "p75_rows", "p90_rows",
+        "status", "timeout_ms", "n_runs", "stop_reason", "median_ci_low", "median_ci_high", "median_ci_rel_width", "median_ci_confidence",
+        "n_workers", "isolation", "concurrency", "reset_strategy"
     ]
-    for col in result_columns:
-        if col not in df.columns:
-            df[col] = None
-
-    with psycopg2.connect(**DB_CONFIG) as conn:
-        for index, row in df.iterrows():
-            query = row["Query"].strip()
-            if not query:
-                continue
-
-            pg_times = []
-            costs = []
-            row_counts = []
-            explain_text_final = None
-
-            # Warm-up run to pre-load data
-            print(f"\n[INFO] Warming up query before measurement...")
-            reset_cache()
-            _ = execute_query(query, conn)
-
-            for run in range(1, N_RUNS + 1):
-                reset_cache()
-                pg_time, cost, row_count, explain_text = execute_query(query, conn)
-
-                if pg_time is None:
-                    df.at[index, f"time_pg_{run}"] = "error"
-                    df.at[index, f"cost_{run}"] = "error"
-                    df.at[index, f"rows_{run}"] = "error"
-                    df.at[index, f"explain_run_{run}"] = "error"
-                    continue
-
-                df.at[index, f"time_pg_{run}"] = pg_time
-                df.at[index, f"cost_{run}"] = cost
-                df.at[index, f"rows_{run}"] = row_count
-                df.at[index, f"explain_run_{run}"] = explain_text
-
-                pg_times.append(pg_time)
-                costs.append(cost)
-                row_counts.append(row_count)
-
-                print(f"\n[Task {row.get('TaskNo', 'N/A')} | Response {row.get('ResponseId', 'N/A')}]")
-                print(f"[RUN {run}/{N_RUNS}]")
-                print(f"   - Execution Time: {pg_time:.4f} ms")
-                print(f"   - Query Cost:     {cost}")
-                print(f"   - Rows Returned:  {row_count}")
-
-            # Aggregating results
-            if pg_times:
-                df.at[index, "avg_pg_time"] = statistics.mean(pg_times)
-                df.at[index, "median_pg_time"] = statistics.median(pg_times)
-                df.at[index, "p75_pg_time"] = statistics.quantiles(pg_times, n=4)[2]
-                df.at[index, "p90_pg_time"] = statistics.quantiles(pg_times, n=10)[8]
-            else:
-                for col in ["avg_pg_time", "median_pg_time", "p75_pg_time", "p90_pg_time"]:
-                    df.at[index, col] = "error"
+    return columns
 
-            if costs and "error" not in costs:
-                df.at[index, "avg_cost"] = statistics.mean(costs)
-                df.at[index, "median_cost"] = statistics.median(costs)
-            else:
-                df.at[index, "avg_cost"] = "error"
-                df.at[index, "median_cost"] = "error"
-
-            if row_counts:
-                df.at[index, "avg_rows"] = statistics.mean(row_counts)
-                df.at[index, "median_rows"] = statistics.median(row_counts)
-                df.at[index, "p75_rows"] = statistics.quantiles(row_counts, n=4)[2]
-                df.at[index, "p90_rows"] = statistics.quantiles(row_counts, n=10)[8]
-            else:
-                for col in ["avg_rows", "median_rows", "p75_rows", "p90_rows"]:
-                    df.at[index, col] = "error"
+# === Tool name recorded in the checkpoint manifest, e.g. "ChatGPT" for ChatGPT_raw_results.csv ===
+def default_tool(query_file):
+    return os.path.basename(query_file).split("_")[0]
+
+# === Main function that runs each query N times, collects performance stats, and saves results to CSV. ===
+def run_experiments(query_file=QUERY_FILE, n_workers=N_WORKERS, isolation=ISOLATION, reset_strategy=RESET_STRATEGY,
+                    store_file=None, fresh=False, tool=None, sampler=None, baseline_file=BASELINE_FILE):
+    if isolation not in ISOLATION_MODES:
+        raise ValueError(f"Unsupported isolation mode: {isolation} (expected one of {ISOLATION_MODES})")
+    if reset_strategy not in RESET_STRATEGIES:
+        raise ValueError(f"Unsupported reset strategy: {reset_strategy} (expected one of {RESET_STRATEGIES})")
+    if n_workers > 1 and reset_strategy in SERVER_WIDE_RESETS and isolation != "full":
+        # Otherwise one worker's reset evicts the page cache under another worker's timed run; pg_stat_reset()
+        # only zeroes counters and does not change timings, so "stats" keeps the requested isolation
+        print(f"[INFO] Reset strategy '{reset_strategy}' is server-wide; using full isolation instead of '{isolation}'")
+        isolation = "full"
+
+    sampler = sampler or default_sampler()
+    df = pd.read_csv(query_file)
+    baseline_medians = load_baseline_medians(baseline_file)
+
+    # Results are appended per query; finished rows with unchanged query text are skipped on restart
+    store = Checkpoint(store_file or query_file + RESULTS_STORE_SUFFIX, tool or default_tool(query_file))
+    if fresh:
+        store.clear()
+
+    tasks = []
+    rows = {}
+    for index, row in df.iterrows():
+        query = row["Query"].strip()
+        if not query or store.is_done(row, query):
+            continue
+        label = f"[Task {row.get('TaskNo', 'N/A')} | Response {row.get('ResponseId', 'N/A')}]"
+        rows[index] = (row, query)
+        timeout_ms = query_timeout(baseline_medians.get(store.row_key(row)[:2]))
+        tasks.append((index, row.get("TaskNo", "N/A"), label, query, timeout_ms))
+
+    skipped = len(df) - len(tasks)
+    if skipped:
+        print(f"[INFO] Resuming: {skipped} queries already measured or empty, {len(tasks)} remaining")
+
+    # Distinct plans are stored once by hash; per-node metrics of every run go to a separate table
+    plan_store = PlanStore(query_file + PLAN_STORE_SUFFIX)
+    nodes_file = query_file + PLAN_NODES_SUFFIX
+
+    concurrency = []
+
+    def save(index, values, details):
+        row, query = rows[index]
+        for explain in details["plans"].values():
+            plan_store.add(explain)
+        append_node_metrics(nodes_file, {"TaskNo": row.get("TaskNo"), "ResponseId": row.get("ResponseId")}, details["nodes"])
+        values["n_workers"] = n_workers
+        values["isolation"] = isolation
+        values["reset_strategy"] = reset_strategy
+        store.record(row, values, values["status"], query)
+        concurrency.append(values["concurrency"])
+
+    if n_workers <= 1:
+        with psycopg2.connect(**DB_CONFIG) as conn:
+            for index, _, label, query, timeout_ms in tasks:
+                values, details = measure_query(query, conn, label, reset_strategy, sampler, timeout_ms)
+                values["concurrency"] = 1
+                save(index, values, details)
+    else:
+        global_lock = mp.Lock()
+        schema_locks = [mp.Lock() for _ in range(SCHEMA_LOCK_STRIPES)]
+        active_measurements = mp.Value("i", 0)
+        peaks = mp.Array("i", n_workers, lock=False)
+        with mp.Pool(
+            processes=n_workers,
+            initializer=_init_worker,
+            initargs=(global_lock, schema_locks, active_measurements, peaks, isolation, reset_strategy, sampler),
+        ) as pool:
+            for index, values, details in pool.imap_unordered(_measure_task, tasks):
+                save(index, values, details)
+
+        if concurrency:
+            print(f"\n[INFO] Concurrency during measurement ({isolation} isolation): "
+                  f"mean {statistics.mean(concurrency):.2f}, max {max(concurrency)} of {n_workers} workers")
 
-            # Save after each row for reliability
-            df.to_csv(QUERY_FILE, index=False)
+    store.materialize(query_file, columns=result_columns(sampler.max_runs))
+    refresh_parquet(query_file)
+    print(f"\nAll experiments completed. Results saved to {query_file}")
 
-    print(f"\nAll experiments completed. Results saved to {QUERY_FILE}")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure SQL query performance with EXPLAIN ANALYZE.")
+    parser.add_argument("--file", type=str, default=QUERY_FILE, help="CSV file with queries (results are written back)")
+    parser.add_argument("--workers", type=int, default=N_WORKERS, help="Number of worker processes, each with its own connection")
+    parser.add_argument("--isolation", type=str, default=ISOLATION, choices=ISOLATION_MODES,
+                        help="none: fully concurrent; schema: serialize queries on the same schema; full: one measurement at a time")
+    parser.add_argument("--reset", type=str, default=RESET_STRATEGY, choices=RESET_STRATEGIES,
+                        help="Cache reset performed before every run (recorded in the reset_strategy column)")
+    parser.add_argument("--min-runs", type=int, default=N_RUNS, help="Minimum number of measured runs per query")
+    parser.add_argument("--max-runs", type=int, default=MAX_RUNS, help="Maximum number of measured runs per query")
+    parser.add_argument("--target-ci", type=float, default=TARGET_CI_WIDTH,
+                        help="Target width of the median's confidence interval, relative to the median")
+    parser.add_argument("--time-budget", type=float, default=TIME_BUDGET_MS, help="Time budget per query for measured runs (ms)")
+    parser.add_argument("--baseline", type=str, default=BASELINE_FILE,
+                        help="Measured initial queries; timeouts are scaled from their median_pg_time")
+    parser.add_argument("--store", type=str, default=None,
+                        help=f"Append-only result store (default: <file>{RESULTS_STORE_SUFFIX})")
+    parser.add_argument("--tool", type=str, default=None,
+                        help="Tool name used in the checkpoint key (default: file name prefix, e.g. Initial)")
+    parser.add_argument("--fresh", action="store_true", help="Discard stored results and measure every query again")
+    parser.add_argument("--materialize", action="store_true",
+                        help="Only write the stored results into the wide CSV, without running queries")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    run_experiments()
+    args = parse_args()
+    if args.materialize:
+        store = Checkpoint(args.store or args.file + RESULTS_STORE_SUFFIX, args.tool or default_tool(args.file))
+        store.materialize(args.file, columns=result_columns(max(args.max_runs, args.min_runs)))
+        refresh_parquet(args.file)
+        print(f"Stored results written to {args.file}")
+    else:
+        sampler = AdaptiveSampler(args.min_runs, args.max_runs, args.target_ci, CI_CONFIDENCE, args.time_budget)
+        run_experiments(args.file, args.workers, args.isolation, args.reset, args.store, args.fresh, args.tool, sampler,
+                        args.baseline)
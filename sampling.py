@@ -0,0 +1,78 @@
+"""
+Adaptive repetition count for query measurements.
+
+A query is executed at least `min_runs` times and then until the distribution-free
+confidence interval of the median is narrower than `target_rel_width` (relative to
+the median), or until the run or time budget is exhausted. The interval is built
+from order statistics with binomial coverage, so no normality is assumed.
+"""
+
+import math
+import statistics
+
+
+def median_ci(samples, confidence=0.95):
+    """Return (low, high, achieved_confidence) of the order-statistic interval for the median.
+
+    The widest interval [x_(k), x_(n-k+1)] is the sample range; if even that does not
+    reach the requested confidence (n < 6 for 95%), it is returned with its lower coverage.
+    """
+    xs = sorted(samples)
+    n = len(xs)
+    if n == 0:
+        return None, None, 0.0
+    alpha = 1 - confidence
+
+    # P(Bin(n, 0.5) <= j) for j = 0..n
+    cdf = []
+    total = 0.0
+    for j in range(n + 1):
+        total += math.comb(n, j) / 2 ** n
+        cdf.append(total)
+
+    k = 1
+    while k + 1 <= (n + 1) // 2 and 2 * cdf[k] <= alpha:
+        k += 1
+    return xs[k - 1], xs[n - k], 1 - 2 * cdf[k - 1]
+
+
+class AdaptiveSampler:
+    """Stopping rule: enough runs for the target median precision, or budget exhausted."""
+
+    def __init__(self, min_runs=5, max_runs=30, target_rel_width=0.05, confidence=0.95, time_budget_ms=60000):
+        self.min_runs = min_runs
+        self.max_runs = max(max_runs, min_runs)
+        self.target_rel_width = target_rel_width
+        self.confidence = confidence
+        self.time_budget_ms = time_budget_ms
+
+    def precision(self, samples):
+        """Return median CI bounds, its width relative to the median, and the achieved confidence."""
+        low, high, achieved = median_ci(samples, self.confidence)
+        if low is None:
+            return {"median_ci_low": None, "median_ci_high": None, "median_ci_rel_width": None, "median_ci_confidence": 0.0}
+        median = statistics.median(samples)
+        rel_width = (high - low) / median if median > 0 else 0.0
+        return {
+            "median_ci_low": low,
+            "median_ci_high": high,
+            "median_ci_rel_width": rel_width,
+            "median_ci_confidence": achieved,
+        }
+
+    def stop_reason(self, samples, runs, elapsed_ms):
+        """Return why sampling should stop ('precision', 'max_runs', 'time_budget', 'no_success'), or None to continue."""
+        if runs < self.min_runs:
+            return None
+        if not samples:
+            # Every run failed: more runs cannot improve a median that does not exist
+            return "no_success"
+        precision = self.precision(samples)
+        if (precision["median_ci_confidence"] >= self.confidence
+                and precision["median_ci_rel_width"] <= self.target_rel_width):
+            return "precision"
+        if runs >= self.max_runs:
+            return "max_runs"
+        if elapsed_ms >= self.time_budget_ms:
+            return "time_budget"
+        return None
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy.stats import mannwhitneyu
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from analysis import mannwhitney_greater
+
+
+def padded(samples, width):
+    """Rows of a run matrix: each sample padded with NaN to the same number of runs."""
+    return np.array([list(s) + [np.nan] * (width - len(s)) for s in samples], dtype=float)
+
+
+@pytest.mark.parametrize('n_a, n_b', [(20, 5), (5, 20), (5, 5), (12, 12), (9, 8)])
+def test_mannwhitney_greater_matches_scipy_per_row(n_a, n_b):
+    rng = np.random.default_rng(n_a * 100 + n_b)
+    a = [rng.normal(10.5, 1.0, n_a) for _ in range(4)]
+    b = [rng.normal(10.0, 1.0, n_b) for _ in range(4)]
+    # A row with ties takes the normal approximation in scipy's auto rule
+    a.append(np.round(rng.normal(10.5, 1.0, n_a)))
+    b.append(np.round(rng.normal(10.0, 1.0, n_b)))
+
+    p_values = mannwhitney_greater(padded(a, 20), padded(b, 20))
+
+    expected = [mannwhitneyu(x, y, alternative='greater').pvalue for x, y in zip(a, b)]
+    np.testing.assert_allclose(p_values, expected, rtol=1e-12)